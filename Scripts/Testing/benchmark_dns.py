@@ -0,0 +1,165 @@
+"""End-to-end DNS benchmark against FakePowerDNS.
+
+Run from the Scripts folder:
+
+    python Testing/benchmark_dns.py [--sizes 10 100 1000 5000] [--latency 0.002] [--error-rate 0] [--no-throttle]
+
+For every size it runs the rebuild (execute_dns), the verifier and a first and
+second (steady-state) reconcile on a fresh fake server with synthetic students,
+and prints request counts, wall time and p50/p99 per-call latency per phase.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Only errors on the console; benchmark runs stay out of the run log
+logging.basicConfig(level=logging.ERROR)
+
+from api_helper import PowerDNSClient, set_client
+from create_dns import execute_dns, NS_TARGETS, PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE
+from ip_allocator import AddressAllocator, AddressPool
+from process_students import build_entries
+from reconcile_dns import reconcile_dns
+from verfiy_dns import run_verification
+from zone_cache import ZoneBodyCache, set_zone_cache
+from fake_powerdns import FakePowerDNS
+
+DEFAULT_SIZES = (10, 100, 1000, 5000)
+
+class TimedClient(PowerDNSClient):
+    """PowerDNSClient that records the method and latency of every call."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.calls = []
+
+    def request(self, method, path, data=None, params=None, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super().request(method, path, data=data, params=params, timeout=timeout)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.calls.append((method, elapsed_ms))
+
+    def take_calls(self):
+        with self._lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+def synthetic_students(count):
+    """count students with unique zones and addresses inside the managed reverse zones."""
+    # One large pool so even 5000 students fit; the IPv6 side stays in IPV6_PTR_ZONE
+    allocator = AddressAllocator([AddressPool("10.0.0.0/16", "2001:6a8:2880:a020::/64", 5, 65000)])
+    emails = [f"student{i}.bench{i}@student.ucll.be" for i in range(count)]
+    return build_entries(emails, allocator)
+
+def seed_fake(fake, stale_zones=10):
+    """The managed zones as a real server has them, plus some leftovers for the cleanup to remove."""
+    fake.add_zone(PARENT_ZONE, rrsets=[
+        {"name": PARENT_ZONE, "type": "NS", "records": [{"content": t, "disabled": False} for t in NS_TARGETS]},
+        {"name": f"old.{PARENT_ZONE}", "type": "NS", "records": [{"content": "ns.old.example.", "disabled": False}]},
+        {"name": f"old.{PARENT_ZONE}", "type": "DS", "records": [{"content": "1 8 2 ABCDEF", "disabled": False}]},
+    ])
+    for zone in (IPV4_PTR_ZONE, IPV6_PTR_ZONE):
+        fake.add_zone(zone, rrsets=[
+            {"name": zone, "type": "NS", "records": [{"content": t, "disabled": False} for t in NS_TARGETS]}
+        ])
+    for i in range(stale_zones):
+        fake.add_zone(f"stale-{i}.{PARENT_ZONE}", kind="Slave", masters=["192.0.2.1"])
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def measure(client, phase, func):
+    client.take_calls()
+    start = time.perf_counter()
+    error = None
+    try:
+        func()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - start
+    calls = client.take_calls()
+    latencies = [ms for _, ms in calls]
+    return {
+        "phase": phase,
+        "wall_seconds": round(wall, 3),
+        "requests": len(calls),
+        "by_method": dict(Counter(method for method, _ in calls)),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "error": error
+    }
+
+def run_size(count, latency=0.0, jitter=0.0, error_rate=0.0, throttle=True):
+    students = synthetic_students(count)
+    results = []
+
+    # Rebuild followed by verification on one server, reconcile on a fresh one.
+    # Each fake server restarts its serials, so each gets its own empty zone cache.
+    with FakePowerDNS(latency=latency, jitter=jitter, error_rate=error_rate, seed=count) as fake, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        seed_fake(fake)
+        client = TimedClient(base_url=fake.base_url, throttles=None if throttle else {})
+        set_client(client)
+        set_zone_cache(ZoneBodyCache(cache_dir))
+        results.append(measure(client, "rebuild", lambda: execute_dns(students)))
+        results.append(measure(client, "verify", lambda: run_verification(students)))
+
+    with FakePowerDNS(latency=latency, jitter=jitter, error_rate=error_rate, seed=count) as fake, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        seed_fake(fake)
+        client = TimedClient(base_url=fake.base_url, throttles=None if throttle else {})
+        set_client(client)
+        set_zone_cache(ZoneBodyCache(cache_dir))
+        results.append(measure(client, "reconcile", lambda: reconcile_dns(students)))
+        results.append(measure(client, "reconcile_noop", lambda: reconcile_dns(students)))
+
+    set_client(None)
+    set_zone_cache(None)
+    for result in results:
+        result["students"] = count
+    return results
+
+def print_results(results):
+    print(f"{'students':>8}  {'phase':<15}{'wall s':>9}{'requests':>10}{'p50 ms':>9}{'p99 ms':>9}  methods")
+    for r in results:
+        methods = " ".join(f"{m}={n}" for m, n in sorted(r["by_method"].items()))
+        line = (f"{r['students']:>8}  {r['phase']:<15}{r['wall_seconds']:>9.3f}{r['requests']:>10}"
+                f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}  {methods}")
+        if r["error"]:
+            line += f"  FAILED: {r['error']}"
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the DNS scripts against a local fake PowerDNS.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of students")
+    parser.add_argument("--latency", type=float, default=0.002, help="server latency per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument("--no-throttle", action="store_true", help="disable the client-side API throttling")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    all_results = []
+    for size in args.sizes:
+        all_results.extend(run_size(size, args.latency, args.jitter, args.error_rate, not args.no_throttle))
+    print_results(all_results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent=2)
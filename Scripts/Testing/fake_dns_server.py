@@ -0,0 +1,135 @@
+"""Local stand-in for an authoritative DNS server, answering SOA and NS queries over UDP.
+
+    python Testing/fake_dns_server.py [port]
+
+serves every zone in Output/processed_Emails.json on 127.0.0.1 (default port
+5353), so the live checks can be tried with:
+
+    DNS_PROBE_SERVER=127.0.0.1 DNS_PROBE_PORT=5353 DNS_PROBE_MASTERS=false python verfiy_dns.py
+"""
+import os
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dns_probe import encode_name, decode_name, TYPE_NS, TYPE_SOA, CLASS_IN
+
+RCODE_VALUES = {"NOERROR": 0, "SERVFAIL": 2, "NXDOMAIN": 3, "REFUSED": 5}
+
+class FakeDnsServer:
+    """Answers SOA/NS for zones = {name: {"serial": int, "ns": [names]}} with the AA bit set.
+
+    Unknown zones get REFUSED, like an authoritative server that does not host them.
+    servfail holds zones that answer SERVFAIL (a slave that never transferred),
+    drop holds zones that never answer, and every answer waits delay seconds.
+    The number of queries received is kept in queries.
+    """
+
+    def __init__(self, zones=None, servfail=(), drop=(), delay=0.0, host="127.0.0.1", port=0):
+        self.zones = {self._key(name): data for name, data in (zones or {}).items()}
+        self.servfail = {self._key(name) for name in servfail}
+        self.drop = {self._key(name) for name in drop}
+        self.delay = delay
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._address = (host, port)
+        self._server = None
+
+    @staticmethod
+    def _key(name):
+        return name.rstrip('.').lower() + '.'
+
+    def start(self):
+        fake = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                data, sock = self.request
+                reply = fake.answer(data)
+                if reply is not None:
+                    sock.sendto(reply, self.client_address)
+
+        self._server = socketserver.ThreadingUDPServer(self._address, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.address
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def answer(self, data):
+        """The reply to one query packet, or None to stay silent."""
+        with self._lock:
+            self.queries += 1
+        try:
+            query_id, _, qdcount = struct.unpack_from("!HHH", data, 0)
+            qname, offset = decode_name(data, 12)
+            qtype, _ = struct.unpack_from("!HH", data, offset)
+        except (ValueError, IndexError, struct.error):
+            return None
+        question = data[12:offset + 4]
+        if self.delay:
+            time.sleep(self.delay)
+
+        if qname in self.drop:
+            return None
+        if qname in self.servfail:
+            return self._reply(query_id, question, "SERVFAIL")
+        zone = self.zones.get(qname)
+        if zone is None:
+            return self._reply(query_id, question, "REFUSED", authoritative=False)
+
+        answers = []
+        if qtype == TYPE_SOA:
+            rdata = (encode_name(f"ns1.{qname}") + encode_name(f"hostmaster.{qname}")
+                     + struct.pack("!IIIII", zone["serial"], 10800, 3600, 604800, 3600))
+            answers.append((qname, TYPE_SOA, rdata))
+        elif qtype == TYPE_NS:
+            answers.extend((qname, TYPE_NS, encode_name(ns)) for ns in zone.get("ns", []))
+        return self._reply(query_id, question, "NOERROR", answers)
+
+    @staticmethod
+    def _reply(query_id, question, rcode, answers=(), authoritative=True):
+        flags = 0x8000 | (0x0400 if authoritative else 0) | RCODE_VALUES[rcode]
+        packet = struct.pack("!HHHHHH", query_id, flags, 1, len(answers), 0, 0) + question
+        for name, rtype, rdata in answers:
+            packet += encode_name(name) + struct.pack("!HHIH", rtype, CLASS_IN, 3600, len(rdata)) + rdata
+        return packet
+
+def zones_for_students(students, serial=1):
+    """What a fully transferred server holds for these students."""
+    return {
+        student["dns_zone"]: {"serial": serial, "ns": [f"ns.{student['dns_zone'].rstrip('.')}."]}
+        for student in students if student.get("dns_zone")
+    }
+
+if __name__ == "__main__":
+    from create_dns import load_students
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5353
+    server = FakeDnsServer(zones_for_students(load_students() or []), port=port)
+    host, port = server.start()
+    print(f"Serving {len(server.zones)} zones on {host}:{port}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,236 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+API_PREFIX = "/api/v1/servers/localhost"
+
+class FakePowerDNS:
+    """In-process stand-in for the PowerDNS HTTP API, served on 127.0.0.1.
+
+    Supports what these scripts use: GET/POST /zones and GET/PUT/PATCH/DELETE
+    /zones/{name} with REPLACE/DELETE rrset changes. Every change bumps the
+    zone's serial and edited_serial. Each request sleeps latency (+ up to jitter)
+    seconds first and fails with error_status with probability error_rate.
+    Request counts per (method, path template) are kept in request_counts.
+
+        with FakePowerDNS(latency=0.002) as fake:
+            set_client(PowerDNSClient(base_url=fake.base_url))
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.zones = {}
+        self.request_counts = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._server = None
+        self._thread = None
+
+    # --- lifecycle ---
+
+    def start(self):
+        fake = self
+
+        class Handler(_Handler):
+            server_fake = fake
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    # --- state ---
+
+    @staticmethod
+    def _key(name):
+        return name.rstrip('.') + '.'
+
+    def add_zone(self, name, kind="Native", rrsets=(), masters=()):
+        """Create a zone directly (no request is counted). rrsets are full rrset dicts."""
+        with self._lock:
+            zone = self._new_zone(name, kind, masters)
+            for rrset in rrsets:
+                zone["rrsets"][(self._key(rrset["name"]), rrset["type"])] = {
+                    "name": self._key(rrset["name"]),
+                    "type": rrset["type"],
+                    "ttl": rrset.get("ttl", 3600),
+                    "records": list(rrset["records"]),
+                    "comments": []
+                }
+        return zone
+
+    def _new_zone(self, name, kind, masters):
+        fqdn = self._key(name)
+        zone = {"name": fqdn, "kind": kind, "masters": list(masters), "serial": 1, "edited_serial": 1,
+                "rrsets": {}}
+        if kind != "Slave":
+            zone["rrsets"][(fqdn, "SOA")] = {
+                "name": fqdn, "type": "SOA", "ttl": 3600, "comments": [],
+                "records": [{"content": f"ns1.{fqdn} hostmaster.{fqdn} 1 10800 3600 604800 3600", "disabled": False}]
+            }
+        self.zones[fqdn] = zone
+        return zone
+
+    def _bump(self, zone):
+        zone["serial"] += 1
+        zone["edited_serial"] = zone["serial"]
+
+    def _summary(self, zone):
+        return {"id": zone["name"], "name": zone["name"], "kind": zone["kind"], "masters": list(zone["masters"]),
+                "serial": zone["serial"], "edited_serial": zone["edited_serial"],
+                "url": f"{API_PREFIX}/zones/{zone['name']}"}
+
+    def _body(self, zone, query):
+        body = self._summary(zone)
+        if query.get("rrsets", ["true"])[0] == "false":
+            return body
+        rrsets = zone["rrsets"].values()
+        if "rrset_name" in query:
+            wanted = self._key(query["rrset_name"][0])
+            rrsets = [rr for rr in rrsets if rr["name"] == wanted]
+        if "rrset_type" in query:
+            rrsets = [rr for rr in rrsets if rr["type"] == query["rrset_type"][0]]
+        body["rrsets"] = [json.loads(json.dumps(rr)) for rr in rrsets]
+        return body
+
+    # --- request handling ---
+
+    def handle(self, method, path, query, data):
+        """Return (status, body) for one API request."""
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._random.uniform(0, self.jitter))
+
+        match = re.fullmatch(re.escape(API_PREFIX) + r"/zones(?:/([^/]+))?", path)
+        template = None
+        if match:
+            template = "/zones/{zone}" if match.group(1) else "/zones"
+        with self._lock:
+            self.request_counts[(method, template or path)] += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self.error_status, {"error": "Injected failure"}
+        if not match:
+            return 404, {"error": "Not Found"}
+
+        with self._lock:
+            if match.group(1) is None:
+                return self._zones_collection(method, query, data)
+            return self._zone_item(method, self._key(match.group(1)), query, data)
+
+    def _zones_collection(self, method, query, data):
+        if method == "GET":
+            if "zone" in query:
+                zone = self.zones.get(self._key(query["zone"][0]))
+                return 200, [self._summary(zone)] if zone else []
+            return 200, [self._summary(zone) for zone in self.zones.values()]
+        if method == "POST":
+            if not data or not data.get("name"):
+                return 422, {"error": "Zone name is required"}
+            fqdn = self._key(data["name"])
+            if fqdn in self.zones:
+                return 409, {"error": f"Domain '{fqdn}' already exists"}
+            zone = self._new_zone(fqdn, data.get("kind", "Native"), data.get("masters", []))
+            for target in data.get("nameservers", []):
+                zone["rrsets"].setdefault((fqdn, "NS"), {"name": fqdn, "type": "NS", "ttl": 3600,
+                                                         "records": [], "comments": []})
+                zone["rrsets"][(fqdn, "NS")]["records"].append({"content": target, "disabled": False})
+            return 201, self._body(zone, {})
+        return 405, {"error": "Method Not Allowed"}
+
+    def _zone_item(self, method, fqdn, query, data):
+        zone = self.zones.get(fqdn)
+        if zone is None:
+            return 404, {"error": f"Could not find domain '{fqdn}'"}
+
+        if method == "GET":
+            return 200, self._body(zone, query)
+        if method == "DELETE":
+            del self.zones[fqdn]
+            return 204, None
+        if method == "PUT":
+            for field in ("kind", "masters"):
+                if field in (data or {}):
+                    zone[field] = data[field]
+            self._bump(zone)
+            return 204, None
+        if method == "PATCH":
+            return self._patch(zone, (data or {}).get("rrsets", []))
+        return 405, {"error": "Method Not Allowed"}
+
+    def _patch(self, zone, changes):
+        # Validate everything first so a bad entry leaves the zone untouched, like PowerDNS
+        for change in changes:
+            name = self._key(change.get("name", ""))
+            if change.get("changetype") not in ("REPLACE", "DELETE"):
+                return 422, {"error": f"Changetype not understood for {name}"}
+            if name != zone["name"] and not name.endswith("." + zone["name"]):
+                return 422, {"error": f"RRset {name} IN {change.get('type')}: Name is out of zone"}
+
+        for change in changes:
+            key = (self._key(change["name"]), change["type"])
+            if change["changetype"] == "DELETE" or not change.get("records"):
+                zone["rrsets"].pop(key, None)
+            else:
+                zone["rrsets"][key] = {"name": key[0], "type": key[1], "ttl": change.get("ttl", 3600),
+                                       "records": list(change["records"]), "comments": []}
+        if changes:
+            self._bump(zone)
+        return 204, None
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this Nagle adds ~40 ms per request
+    disable_nagle_algorithm = True
+    server_fake = None
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            self._send(400, {"error": "Invalid JSON"})
+            return
+        status, body = self.server_fake.handle(self.command, url.path, parse_qs(url.query), data)
+        self._send(status, body)
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if payload:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass
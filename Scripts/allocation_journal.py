@@ -0,0 +1,96 @@
+import json
+import os
+from atomic_file import write_json_atomic
+from config import JOURNAL_COMPACT_EVERY
+
+class AllocationJournal:
+    """processed_Emails.json snapshot plus an append-only JSON Lines journal.
+
+    Each journal line is {"op": "allocate", "entry": {...}} or
+    {"op": "release", "email": "..."} and is fsynced before the call returns.
+    load() reads the snapshot and replays the journal on top of it; replaying is
+    idempotent, so a crash during compaction never loses or duplicates an entry.
+    A torn last line from a crash mid-append is ignored. compact() folds the
+    journal into a new snapshot (written to a temp file, fsynced and renamed).
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, compact_every=JOURNAL_COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal.jsonl"
+        self.compact_every = compact_every
+        self.pending = 0
+
+    def load(self):
+        """Current entries in allocation order."""
+        entries = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                for entry in json.load(f):
+                    entries[entry["original_email"]] = entry
+
+        self.pending = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r") as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        print(f"Warning: skipping unreadable line {line_number} in {self.journal_path}")
+                        continue
+                    self._apply(entries, record)
+                    self.pending += 1
+        return list(entries.values())
+
+    @staticmethod
+    def _apply(entries, record):
+        if record["op"] == "allocate":
+            entry = record["entry"]
+            entries[entry["original_email"]] = entry
+        elif record["op"] == "release":
+            entries.pop(record["email"], None)
+
+    def _ends_with_torn_line(self):
+        if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+            return False
+        with open(self.journal_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def _append(self, records):
+        if not records:
+            return
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        if self._ends_with_torn_line():
+            data = "\n" + data
+        with open(self.journal_path, "a") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending += len(records)
+
+    def record_allocations(self, entries):
+        self._append([{"op": "allocate", "entry": entry} for entry in entries])
+
+    def record_releases(self, emails):
+        self._append([{"op": "release", "email": email} for email in emails])
+
+    def compact(self, entries):
+        """Write entries as the new snapshot and empty the journal."""
+        write_json_atomic(self.snapshot_path, entries, durable=True, indent=4)
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "w") as f:
+                f.flush()
+                os.fsync(f.fileno())
+        self.pending = 0
+
+    def maybe_compact(self, entries):
+        """Compact once the journal holds compact_every records."""
+        if self.pending >= self.compact_every:
+            self.compact(entries)
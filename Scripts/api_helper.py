@@ -1,48 +1,167 @@
+import logging
+import re
+import threading
+import time
+from contextlib import nullcontext
 import requests
-from config import API_URL, AUTH, HEADERS
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (
+    API_URL, AUTH, HEADERS,
+    API_POOL_SIZE, API_CONNECT_TIMEOUT, API_READ_TIMEOUT, API_RETRIES, API_BACKOFF
+)
+from metrics import get_metrics
+from throttle import build_throttles, endpoint_class
 
-def api_get(path):
-    url = f"{API_URL}{path}"
-    r = requests.get(url, headers=HEADERS, auth=AUTH)
-    r.raise_for_status()
-    return r.json()
+class PowerDNSClient:
+    """Keep-alive PowerDNS API client backed by a single pooled requests.Session.
+
+    Idempotent verbs (GET/PUT/DELETE) are retried with exponential backoff on
+    connection errors and 429/5xx responses. POST and PATCH are never retried.
+    Every call, failed or not, is recorded in metrics (see metrics.py).
+    Calls are throttled per endpoint class (see throttle.py); pass throttles={}
+    to disable that.
+    """
+
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, base_url=API_URL, auth=AUTH, headers=HEADERS, pool_size=API_POOL_SIZE,
+                 timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT), retries=API_RETRIES, backoff=API_BACKOFF,
+                 metrics=None, throttles=None):
+        self.base_url = (base_url or "").rstrip("/")
+        self.timeout = timeout
+        self.metrics = metrics or get_metrics()
+        self.throttles = build_throttles() if throttles is None else throttles
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=self.IDEMPOTENT_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.headers.update(headers)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, data=None, params=None, timeout=None):
+        url = f"{self.base_url}{path}"
+        throttle = self.throttles.get(endpoint_class(method, path, params))
+        with throttle.slot() if throttle else nullcontext({}) as outcome:
+            start = time.perf_counter()
+            try:
+                r = self.session.request(method, url, json=data, params=params, timeout=timeout or self.timeout)
+            except requests.RequestException as e:
+                outcome["congested"] = True
+                self.metrics.record(method, path, type(e).__name__, time.perf_counter() - start, error=type(e).__name__)
+                if method not in ("GET", "HEAD"):
+                    # The write may still have reached the server
+                    _notify_zone_write(method, path, data)
+                raise
+            retries = self._retries(r)
+            outcome["congested"] = r.status_code in self.RETRY_STATUSES or retries > 0
+            self._record(method, path, r, time.perf_counter() - start, retries)
+            if method not in ("GET", "HEAD"):
+                _notify_zone_write(method, path, data)
+        r.raise_for_status()
+        return r
+
+    @staticmethod
+    def _retries(r):
+        retry_state = getattr(r.raw, "retries", None)
+        return len(retry_state.history) if retry_state is not None else 0
+
+    def _record(self, method, path, r, seconds, retries):
+        self.metrics.record(
+            method, path, r.status_code, seconds,
+            bytes_sent=len(r.request.body or b""),
+            bytes_received=len(r.content),
+            retries=retries,
+            error=f"HTTP {r.status_code}" if r.status_code >= 400 else None
+        )
+
+    @staticmethod
+    def _json(r):
+        return r.json() if r.content else None
+
+    def get(self, path, params=None, timeout=None):
+        return self._json(self.request("GET", path, params=params, timeout=timeout))
+
+    def post(self, path, data, timeout=None):
+        return self._json(self.request("POST", path, data=data, timeout=timeout))
+
+    def put(self, path, data, timeout=None):
+        return self._json(self.request("PUT", path, data=data, timeout=timeout))
+
+    def patch(self, path, data, timeout=None):
+        return self._json(self.request("PATCH", path, data=data, timeout=timeout))
+
+    def delete(self, path, timeout=None):
+        return self.request("DELETE", path, timeout=timeout).status_code == 204
+
+    def close(self):
+        self.session.close()
+
+_zone_write_listeners = []
+
+def on_zone_write(callback):
+    """Call callback(zone_name) after every write request to a zone, failed or not."""
+    _zone_write_listeners.append(callback)
+
+def _notify_zone_write(method, path, data):
+    match = re.match(r"^/zones/([^/?]+)", path)
+    if match:
+        zone_name = match.group(1)
+    elif method == "POST" and path.rstrip("/") == "/zones" and data and data.get("name"):
+        zone_name = data["name"]
+    else:
+        return
+    for callback in _zone_write_listeners:
+        callback(zone_name)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the shared PowerDNS client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PowerDNSClient()
+    return _client
+
+def set_client(client):
+    """Replace the shared client (e.g. to point at another server); closes the old one."""
+    global _client
+    with _client_lock:
+        old, _client = _client, client
+    if old is not None and old is not client:
+        old.close()
+
+def api_get(path, params=None):
+    return get_client().get(path, params=params)
 
 def api_post(path, data):
-    url = f"{API_URL}{path}"
-    r = requests.post(url, headers=HEADERS, json=data, auth=AUTH)
-    r.raise_for_status()
-    return r.json()
+    return get_client().post(path, data)
 
 def api_put(path, data):
-    url = f"{API_URL}{path}"
-    r = requests.put(url, headers=HEADERS, json=data, auth=AUTH)
-    r.raise_for_status()
-    return r.json()
+    return get_client().put(path, data)
 
 def api_patch(path, data):
-    url = f"{API_URL}{path}"
-    # print(f"🔁data: {data}")
+    # Callers expect None on failure; the error is logged and counted in the metrics
     try:
-        r = requests.patch(url, headers=HEADERS, json=data, auth=AUTH)
-        r.raise_for_status()
-        # print(f"✅ PATCH {url} succeeded with status {r.status_code}")
-        if r.content:
-            # print("🔁 Response content:", r.text)
-
-            return r.json()
-        else:
-            # print("ℹ️ No response content.")
-            return None
-    except requests.exceptions.HTTPError as e:
-        # print(f"❌ HTTP error for PATCH {url}: {e}")
-        # print("🔁 Response text:", r.text)
-        return None
-    except Exception as e:
-        # print(f"❌ General error during PATCH {url}: {e}")
+        return get_client().patch(path, data)
+    except requests.exceptions.RequestException as e:
+        logging.error("PATCH %s failed: %s", path, e)
         return None
 
 def api_delete(path):
-    url = f"{API_URL}{path}"
-    r = requests.delete(url, headers=HEADERS, auth=AUTH)
-    r.raise_for_status()
-    return r.status_code == 204
\ No newline at end of file
+    return get_client().delete(path)
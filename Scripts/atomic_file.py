@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+
+# os.umask can only be read by setting it, which is not thread-safe, so read it once at import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _fsync_dir(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def write_atomic(path, text, mode=0o666, durable=False):
+    """Replace path with text so readers see either the old or the new file, never half of one.
+
+    The parent directory is created if needed. mode sets the permissions of the
+    new file (before the umask), and durable fsyncs the file and its directory.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Unique temp file per call, so threads and processes writing the same file never share one
+    fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            # mkstemp creates the file 0600; apply mode minus the umask like open() would
+            os.fchmod(f.fileno(), mode & ~_UMASK)
+            f.write(text)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durable:
+        _fsync_dir(path)
+
+def write_json_atomic(path, data, mode=0o666, durable=False, **dump_kwargs):
+    """write_atomic for data serialized with json.dumps(data, **dump_kwargs)."""
+    write_atomic(path, json.dumps(data, **dump_kwargs), mode=mode, durable=durable)
@@ -0,0 +1,24 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+def run_bounded(func, items, max_workers, catch=(Exception,)):
+    """Call func(item) for every item with at most max_workers calls in flight.
+
+    Returns a list of (result, error) tuples in the same order as items. Exceptions
+    matching catch are returned as the error instead of being raised; anything else
+    propagates. With max_workers <= 1 the items are processed sequentially.
+    Each call runs in a copy of the caller's context, so log_stage tags carry over.
+    """
+    items = list(items)
+
+    def run(item):
+        try:
+            return func(item), None
+        except catch as e:
+            return None, e
+
+    if max_workers > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, run, item) for item in items]
+            return [future.result() for future in futures]
+    return [run(item) for item in items]
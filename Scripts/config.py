@@ -17,3 +17,112 @@ HEADERS = {
     "X-API-Key": API_KEY,
     "Content-Type": "application/json"
 }
+
+# PowerDNS client tuning (connection pool, timeouts in seconds, retries)
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "16"))
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "30"))
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+API_BACKOFF = float(os.getenv("API_BACKOFF", "0.5"))
+
+# Maximum number of concurrent PowerDNS requests during bulk zone operations.
+# Keep this at or below API_POOL_SIZE so workers never wait on a connection.
+DNS_MAX_WORKERS = int(os.getenv("DNS_MAX_WORKERS", "8"))
+
+# "rebuild" deletes and recreates every student zone; "reconcile" only applies the diff
+DNS_MODE = os.getenv("DNS_MODE", "rebuild")
+
+# Maximum number of rrsets sent in a single PATCH (e.g. all PTRs of a reverse zone)
+RRSET_BATCH_SIZE = int(os.getenv("RRSET_BATCH_SIZE", "500"))
+
+# Blackboard scraper: parallel user-detail requests and overall request rate (per second, 0 = unlimited)
+SCRAPER_MAX_WORKERS = int(os.getenv("SCRAPER_MAX_WORKERS", "8"))
+SCRAPER_RATE_LIMIT = float(os.getenv("SCRAPER_RATE_LIMIT", "10"))
+
+# Per-user Blackboard data cached between runs (empty to disable)
+ROSTER_CACHE_FILE = os.getenv("ROSTER_CACHE_FILE", "Output/roster_cache.json")
+
+# Blackboard session cookies reused between runs (empty to always log in)
+COOKIE_FILE = os.getenv("COOKIE_FILE", "Output/.blackboard_cookies.json")
+
+# Address pools as comma separated "ipv4_network=ipv6_prefix" pairs, filled in order.
+# Hosts POOL_FIRST_HOST..POOL_LAST_HOST of every pool are handed out to students.
+ADDRESS_POOLS = os.getenv("ADDRESS_POOLS", "193.191.176.0/24=2001:6a8:2880:a020::/64")
+POOL_FIRST_HOST = int(os.getenv("POOL_FIRST_HOST", "5"))
+POOL_LAST_HOST = int(os.getenv("POOL_LAST_HOST", "253"))
+
+# SQLite database for processed students; empty keeps using Output/processed_Emails.json.
+# An empty database is seeded from that JSON file on first use.
+STUDENT_DB = os.getenv("STUDENT_DB", "")
+
+# Fold the allocation journal back into processed_Emails.json after this many records
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "100"))
+
+# Default course and zones; runner.py reads one such mapping per course from RUNNER_CONFIG
+COURSE_ID = os.getenv("COURSE_ID", "_86740_1")
+PARENT_ZONE = "sasm.uclllabs.be"
+IPV4_PTR_ZONE = "176.191.193.in-addr.arpa"
+IPV6_PTR_ZONE = "a.0.8.8.2.8.a.6.0.1.0.0.2.ip6.arpa"
+RUNNER_CONFIG = os.getenv("RUNNER_CONFIG", "courses.json")
+RUNNER_MAX_COURSES = int(os.getenv("RUNNER_MAX_COURSES", "4"))
+
+# Local copy of the PowerDNS zones used by `zone_mirror.py plan`, and where plans are saved
+ZONE_MIRROR_DIR = os.getenv("ZONE_MIRROR_DIR", "Output/zone_mirror")
+DNS_PLAN_FILE = os.getenv("DNS_PLAN_FILE", "Output/dns_plan.json")
+
+# PowerDNS API metrics written at the end of a run (empty to skip). Point METRICS_PROM_FILE
+# into the node_exporter textfile-collector directory to scrape it.
+METRICS_JSON_FILE = os.getenv("METRICS_JSON_FILE", "Output/api_metrics.json")
+METRICS_PROM_FILE = os.getenv("METRICS_PROM_FILE", "Output/api_metrics.prom")
+
+# Run log, written by a background thread and rotated at LOG_MAX_BYTES.
+# LOG_FORMAT "json" writes one JSON object per line with run_id and stage.
+LOG_FILE = os.getenv("LOG_FILE", "Output/Dns_Create_log.txt")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+# Client-side PowerDNS API throttling per endpoint class: zone list (GET /zones), zone
+# read (GET /zones/<zone>) and zone write (POST/PUT/PATCH/DELETE). Rates are requests per
+# second (0 = unlimited). Concurrency starts at the maximum, halves on 429/5xx, retries or
+# latency above API_LATENCY_FACTOR x normal (0 = ignore latency) and grows back when healthy.
+API_RATE_ZONE_LIST = float(os.getenv("API_RATE_ZONE_LIST", "2"))
+API_RATE_ZONE_READ = float(os.getenv("API_RATE_ZONE_READ", "100"))
+API_RATE_ZONE_WRITE = float(os.getenv("API_RATE_ZONE_WRITE", "50"))
+API_CONCURRENCY_ZONE_LIST = int(os.getenv("API_CONCURRENCY_ZONE_LIST", "2"))
+API_CONCURRENCY_ZONE_READ = int(os.getenv("API_CONCURRENCY_ZONE_READ", "16"))
+API_CONCURRENCY_ZONE_WRITE = int(os.getenv("API_CONCURRENCY_ZONE_WRITE", "8"))
+API_MIN_CONCURRENCY = int(os.getenv("API_MIN_CONCURRENCY", "1"))
+API_LATENCY_FACTOR = float(os.getenv("API_LATENCY_FACTOR", "3"))
+
+# Download only the NS/DS rrsets during zone cleanup (needs a PowerDNS version with the rrset_type filter)
+RRSET_FILTER = os.getenv("RRSET_FILTER", "false").lower() in ("1", "true", "yes")
+
+# Live DNS verification: when DNS_PROBE_SERVER is set, verfiy_dns.py also queries it over
+# UDP for the SOA and NS of every student zone. With DNS_PROBE_MASTERS the SOA serial of the
+# student's master (their ipv4) is compared too, to spot slaves that did not catch up.
+DNS_PROBE_SERVER = os.getenv("DNS_PROBE_SERVER", "")
+DNS_PROBE_PORT = int(os.getenv("DNS_PROBE_PORT", "53"))
+DNS_PROBE_TIMEOUT = float(os.getenv("DNS_PROBE_TIMEOUT", "2"))
+DNS_PROBE_RETRIES = int(os.getenv("DNS_PROBE_RETRIES", "1"))
+DNS_PROBE_CONCURRENCY = int(os.getenv("DNS_PROBE_CONCURRENCY", "200"))
+DNS_PROBE_MASTERS = os.getenv("DNS_PROBE_MASTERS", "true").lower() in ("1", "true", "yes")
+
+# Full zone bodies kept on disk between runs, reused while the zone's serial is unchanged (empty = off)
+ZONE_CACHE_DIR = os.getenv("ZONE_CACHE_DIR", "Output/zone_cache")
+
+# Watch mode (watch.py): poll the roster every WATCH_INTERVAL seconds and apply a change once it has
+# been stable for WATCH_DEBOUNCE seconds. Dropping more than WATCH_MAX_REMOVALS students at once is
+# held back. A full reconcile runs every WATCH_RESYNC_INTERVAL seconds (0 = only at start-up).
+# Status goes to WATCH_STATUS_FILE and, with WATCH_HEALTH_PORT set, to GET /health and /status.
+WATCH_INTERVAL = int(os.getenv("WATCH_INTERVAL", "300"))
+WATCH_DEBOUNCE = int(os.getenv("WATCH_DEBOUNCE", "120"))
+WATCH_MAX_REMOVALS = int(os.getenv("WATCH_MAX_REMOVALS", "25"))
+WATCH_RESYNC_INTERVAL = int(os.getenv("WATCH_RESYNC_INTERVAL", "86400"))
+WATCH_STATUS_FILE = os.getenv("WATCH_STATUS_FILE", "Output/watch_status.json")
+# Emails the watcher has seen on the roster; only those are ever released (hand-added entries stay)
+WATCH_STATE_FILE = os.getenv("WATCH_STATE_FILE", "Output/watch_state.json")
+WATCH_HEALTH_PORT = int(os.getenv("WATCH_HEALTH_PORT", "0"))
+# Comma separated emails on the roster that never get a zone (like the lecturer in main.py)
+WATCH_EXCLUDE_EMAILS = os.getenv("WATCH_EXCLUDE_EMAILS", "pieter.geens@ucll.be")
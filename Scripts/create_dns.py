@@ -1,87 +1,201 @@
 import ipaddress
-import json
+import os
 import re
 import requests
 import logging
-from api_helper import api_get, api_patch, api_post, api_put, api_delete
-
-# Setup logging
-logging.basicConfig(
-    filename='Output/Dns_Create_log.txt',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+import threading
+from api_helper import get_client, api_get, api_patch, api_post, api_delete
+from concurrency import run_bounded
+from pipeline import Stage, run_stages
+from config import (
+    DNS_MAX_WORKERS, RRSET_BATCH_SIZE, RRSET_FILTER, STUDENT_DB,
+    PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE
 )
+from student_store import open_store
+from zone_cache import fetch_zone
+from process_students import load_students as load_processed_students
+
+NS_TARGETS = ("ns1.uclllabs.be.", "ns2.uclllabs.be.")
+# NS/DS records whose name matches this pattern survive the zone cleanup
+EXCLUDE_PATTERN = r'(.*-.*|pieter|rudi)\.sasm\.uclllabs\.be'
+STUDENTS_FILE = 'Output/processed_Emails.json'
+CLEANUP_TYPES = ('NS', 'DS')
 
 def list_all_zones():
     zones = api_get("/zones")
-    logging.info(f"Found {len(zones)} zones")
+    logging.info("Found %s zones", len(zones))
     return [zone['name'] for zone in zones]
 
 def delete_all_sasm_zones():
-    logging.info("Deleting all .sasm.uclllabs.be zones...")
+    """Delete every zone below PARENT_ZONE. Returns a ZoneNameSet of the zones that are left."""
+    logging.info("Deleting all .%s zones...", PARENT_ZONE)
     zones = list_all_zones()
+    remaining = ZoneNameSet(zones)
     for zone in zones:
-        if zone.endswith(".sasm.uclllabs.be."):
-            logging.info(f"Deleting zone {zone}")
+        if zone.endswith(f".{PARENT_ZONE}."):
+            logging.info("Deleting zone %s", zone)
             api_delete(f"/zones/{zone}")
+            remaining.discard(zone)
+    return remaining
 
-def get_zone(zone_name):
+def get_zone(zone_name, params=None):
+    """The zone body, or None if it does not exist. Unfiltered reads go through the zone cache."""
     try:
-        return api_get(f"/zones/{zone_name}")
+        if params is None:
+            return fetch_zone(zone_name)
+        return api_get(f"/zones/{zone_name}", params=params)
     except requests.HTTPError as e:
         if e.response.status_code == 404:
-            logging.warning(f"Zone {zone_name} not found")
+            logging.warning("Zone %s not found", zone_name)
             return None
         raise
 
-def update_zone_remove_ns_ds(zone_name, exclude_patterns):
-    zone = get_zone(zone_name)
-    if not zone:
-        return
-    
-    records = zone.get('rrsets', [])
-    exclude_regex = re.compile(exclude_patterns)
-    new_records = []
+def _ns_ds_rrsets(zone_name, use_filter):
+    """NS and DS rrsets of zone_name, or None if the zone does not exist.
+
+    With use_filter only those rrsets are downloaded (the rrset_type filter of newer
+    PowerDNS versions); servers that ignore the parameter return the whole zone,
+    so the result is filtered here too.
+    """
+    if not use_filter:
+        zone = get_zone(zone_name)
+        rrsets = zone.get('rrsets', []) if zone else None
+    else:
+        rrsets = []
+        for rtype in CLEANUP_TYPES:
+            zone = get_zone(zone_name, params={"rrset_type": rtype})
+            if not zone:
+                return None
+            rrsets.extend(zone.get('rrsets', []))
+    if rrsets is None:
+        return None
+    unique = {(r['name'], r['type']): r for r in rrsets if r['type'] in CLEANUP_TYPES}
+    return list(unique.values())
+
+def update_zone_remove_ns_ds(zone_name, exclude_patterns, use_filter=RRSET_FILTER):
+    """Delete the NS and DS rrsets below zone_name whose name does not match exclude_patterns.
+
+    Only DELETE changes for those rrsets are sent, and nothing at all when none match.
+    Returns the failures as a list of (zone_name, error); a missing zone is one too.
+    """
+    records = _ns_ds_rrsets(zone_name, use_filter)
+    if records is None:
+        return [(zone_name, "zone does not exist")]
 
+    exclude_regex = re.compile(exclude_patterns)
+    apex = zone_name.rstrip('.') + '.'
+    deletes = []
     for record in records:
-        if record['type'] in ['NS', 'DS']:
-            if exclude_regex.search(record['name']):
-                new_records.append(record)
-            else:
-                logging.info(f"Removing {record['type']} record: {record['name']}")
-        else:
-            new_records.append(record)
+        # The zone's own NS (and DS) rrsets are never cleaned up, only delegations below it
+        if record['name'] != apex and not exclude_regex.search(record['name']):
+            logging.info("Removing %s record: %s", record['type'], record['name'])
+            deletes.append({"name": record['name'], "type": record['type'], "changetype": "DELETE"})
 
-    for r in new_records:
-        r["changetype"] = "REPLACE"
+    if not deletes:
+        logging.info("No unwanted NS/DS records in zone %s", zone_name)
+        return []
 
-    logging.info(f"Updating zone {zone_name} to remove unwanted NS/DS records...")
-    api_patch(f"/zones/{zone_name}", {"rrsets": new_records})
+    logging.info("Updating zone %s to remove %s unwanted NS/DS records...", zone_name, len(deletes))
+    return patch_rrsets(zone_name, deletes)
 
 def verify_zones(zones):
     logging.info("Verifying zones...")
     for zone in zones:
-        logging.info(f"Zone: {zone}")
+        logging.info("Zone: %s", zone)
         # zone_data = get_zone(zone)
         # if zone_data:
         #     logging.info(json.dumps(zone_data, indent=2))
 
-def create_slave_zone(zone_name, ipv4, ipv6):
+class ZoneNameSet:
+    """Names of the zones on the server, from one /zones listing and kept current locally.
+
+    Lets the creation phase decide which zones exist without a GET per zone.
+    Names are stored with a trailing dot; lookups accept either form.
+    """
+
+    def __init__(self, names=()):
+        self._lock = threading.Lock()
+        self._names = {self._key(name) for name in names}
+
+    @staticmethod
+    def _key(name):
+        return name.rstrip('.') + '.'
+
+    @classmethod
+    def fetch(cls):
+        return cls(zone["name"] for zone in api_get("/zones"))
+
+    def __contains__(self, name):
+        return self._key(name) in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name):
+        """Add name; returns False if it was already there."""
+        key = self._key(name)
+        with self._lock:
+            if key in self._names:
+                return False
+            self._names.add(key)
+            return True
+
+    def discard(self, name):
+        with self._lock:
+            self._names.discard(self._key(name))
+
+def ensure_slave_zone(zone_name, ipv4, ipv6, existing=None):
+    """Create the slave zone unless it already exists. Returns True if it was created.
+
+    With existing (a ZoneNameSet) existence is looked up locally and the new zone
+    is added to it; otherwise the zone is fetched first.
+    """
     stripped_zone_name = zone_name.rstrip(".")
     normal_zone_name = stripped_zone_name + "."       
-    if get_zone(stripped_zone_name):
-        logging.info(f"Zone {stripped_zone_name} already exists, skipping creation.")
-        return
+    if existing is not None:
+        if normal_zone_name in existing:
+            return False
+    elif get_zone(stripped_zone_name):
+        return False
     data = {
         "name": normal_zone_name,
         "kind": "Slave",
         "masters": [ipv4, ipv6],
         "nameservers": []
     }
-    api_post("/zones", data)
-    logging.info(f"Creating slave zone {stripped_zone_name} with masters {ipv4}, {ipv6}")
+    try:
+        api_post("/zones", data)
+    except requests.HTTPError as e:
+        # 409: created by someone else since the listing
+        if e.response is not None and e.response.status_code == 409:
+            if existing is not None:
+                existing.add(normal_zone_name)
+            return False
+        raise
+    if existing is not None:
+        existing.add(normal_zone_name)
+    return True
+
+def _log_slave_zone_result(zone_name, ipv4, ipv6, created):
+    stripped_zone_name = zone_name.rstrip(".")
+    if created:
+        logging.info("Creating slave zone %s with masters %s, %s", stripped_zone_name, ipv4, ipv6)
+    else:
+        logging.debug("Zone %s already exists, skipping creation.", stripped_zone_name)
 
-def create_slave_zones_from_students(students):
+def create_slave_zone(zone_name, ipv4, ipv6):
+    created = ensure_slave_zone(zone_name, ipv4, ipv6)
+    _log_slave_zone_result(zone_name, ipv4, ipv6, created)
+
+def create_slave_zones_from_students(students, max_workers=DNS_MAX_WORKERS, existing=None):
+    """Create a slave zone per student with at most max_workers requests in flight.
+
+    Which zones exist comes from one /zones listing (or the given ZoneNameSet), so
+    only the missing zones cost a request. Results are logged in student order once
+    all zones are processed. Returns a list of (zone_name, error) tuples for the
+    zones that failed.
+    """
+    jobs = {}
     for student in students:
         zone_name = student.get("dns_zone")
         ipv4 = student.get("ipv4")
@@ -90,22 +204,39 @@ def create_slave_zones_from_students(students):
         if not zone_name or not ipv4 or not ipv6:
             continue  
 
-        try:
-            create_slave_zone(zone_name, ipv4, ipv6)
-        except requests.HTTPError as e:
-            logging.error(f"Failed creating zone {zone_name}: {e}")
+        jobs.setdefault(zone_name.rstrip(".") + ".", (zone_name, ipv4, ipv6))
+    jobs = list(jobs.values())
+
+    if existing is None:
+        existing = ZoneNameSet.fetch()
+    logging.info("%s of %s student zones already exist", sum(job[0] in existing for job in jobs), len(jobs))
+
+    results = run_bounded(lambda job: ensure_slave_zone(*job, existing=existing), jobs, max_workers,
+                          catch=requests.HTTPError)
+
+    errors = []
+    for (zone_name, ipv4, ipv6), (created, error) in zip(jobs, results):
+        if error is not None:
+            logging.error("Failed creating zone %s: %s", zone_name, error)
+            errors.append((zone_name, error))
+        else:
+            _log_slave_zone_result(zone_name, ipv4, ipv6, created)
+    return errors
 
 def add_ns_records_parent_zone_from_students(students):
-    """Add NS and glue A/AAAA records to sasm.uclllabs.be for each student, skipping if already present."""
+    """Add NS and glue A/AAAA records to sasm.uclllabs.be for each student, skipping if already present.
 
-    zone_name = "sasm.uclllabs.be"
+    Returns the failures as a list of (zone_name, error).
+    """
+
+    zone_name = PARENT_ZONE
     zone = get_zone(zone_name)
 
     if not zone:
-        logging.error(f"❌ Parent zone {zone_name} does not exist.")
-        return
+        logging.error("Parent zone %s does not exist.", zone_name)
+        return [(zone_name, "zone does not exist")]
 
-    logging.info(f"✅ Found parent zone: {zone_name}")
+    logging.info("Found parent zone: %s", zone_name)
     rrsets = zone.get("rrsets", [])
     rrset_map = {(r["name"], r["type"]): r for r in rrsets}
     updated_rrsets = {}
@@ -118,11 +249,7 @@ def add_ns_records_parent_zone_from_students(students):
 
         # --- NS Records ---
         ns_key = (zone_fqdn, "NS")
-        desired_ns_targets = {
-            "ns1.uclllabs.be.",
-            "ns2.uclllabs.be.",
-            ns_name
-        }
+        desired_ns_targets = {*NS_TARGETS, ns_name}
 
         existing_ns = rrset_map.get(ns_key, {}).get("records", [])
         existing_ns_contents = {r["content"] for r in existing_ns}
@@ -141,9 +268,9 @@ def add_ns_records_parent_zone_from_students(students):
                 "changetype": "REPLACE",
                 "records": new_records
             }
-            logging.info(f"✅ Updating NS records for {zone_fqdn} → {', '.join(desired_ns_targets)}")
+            logging.debug("Updating NS records for %s → %s", zone_fqdn, ', '.join(desired_ns_targets))
         else:
-            logging.info(f"ℹ️ NS records for {zone_fqdn} already up to date.")
+            logging.debug("NS records for %s already up to date.", zone_fqdn)
 
         # --- A Glue Record ---
         a_key = (ns_name, "A")
@@ -158,9 +285,9 @@ def add_ns_records_parent_zone_from_students(students):
                 "changetype": "REPLACE",
                 "records": [{"content": ipv4, "disabled": False}]
             }
-            logging.info(f"🔧 Added A glue record for {ns_name} → {ipv4}")
+            logging.debug("Added A glue record for %s → %s", ns_name, ipv4)
         else:
-            logging.info(f"ℹ️ A record for {ns_name} already exists with {ipv4}")
+            logging.debug("A record for %s already exists with %s", ns_name, ipv4)
 
         # --- AAAA Glue Record ---
         aaaa_key = (ns_name, "AAAA")
@@ -175,15 +302,15 @@ def add_ns_records_parent_zone_from_students(students):
                 "changetype": "REPLACE",
                 "records": [{"content": ipv6, "disabled": False}]
             }
-            logging.info(f"🔧 Added AAAA glue record for {ns_name} → {ipv6}")
+            logging.debug("Added AAAA glue record for %s → %s", ns_name, ipv6)
         else:
-            logging.info(f"ℹ️ AAAA record for {ns_name} already exists with {ipv6}")
+            logging.debug("AAAA record for %s already exists with %s", ns_name, ipv6)
 
     if updated_rrsets:
-        logging.info(f"🚀 Patching parent zone {zone_name} with {len(updated_rrsets)} updated RRsets...")
-        api_patch(f"/zones/{zone_name}", {"rrsets": list(updated_rrsets.values())})
-    else:
-        logging.info(f"✅ No changes needed. All NS and glue records are already present.")
+        logging.info("Patching parent zone %s with %s updated RRsets...", zone_name, len(updated_rrsets))
+        return patch_rrsets(zone_name, list(updated_rrsets.values()))
+    logging.info("No changes needed. All NS and glue records are already present.")
+    return []
 
 def ipv4_to_arpa(ipv4):
     return ".".join(reversed(ipv4.split("."))) + ".in-addr.arpa"
@@ -197,50 +324,56 @@ def ipv6_to_arpa(ipv6):
     reversed_nibbles = ".".join(reversed(hex_digits))
     return reversed_nibbles + ".ip6.arpa"
 
+def build_ptr_rrset(full_ptr_name, ptr_target):
+    """Return a REPLACE PTR rrset, or None if ptr_target is empty."""
+    if not ptr_target or not ptr_target.strip():
+        return None
+    fqdn = ptr_target if ptr_target.endswith('.') else ptr_target + '.'
+    full_ptr_name = full_ptr_name if full_ptr_name.endswith('.') else full_ptr_name + '.'
+
+    return {
+        "name": full_ptr_name,
+        "type": "PTR",
+        "ttl": 3600,
+        "changetype": "REPLACE",
+        "records": [{"content": fqdn, "disabled": False}]
+    }
+
+def patch_rrsets(zone_name, rrsets, batch_size=RRSET_BATCH_SIZE):
+    """PATCH rrsets into zone_name using as few requests as possible (batch_size rrsets each).
+
+    Failed batches are logged and returned as a list of (zone_name, error).
+    """
+    batch_size = max(1, batch_size)
+    errors = []
+    for start in range(0, len(rrsets), batch_size):
+        batch = rrsets[start:start + batch_size]
+        logging.info("Patching zone %s with %s RRsets (%s/%s)", zone_name, len(batch), start + len(batch), len(rrsets))
+        try:
+            get_client().patch(f"/zones/{zone_name}", {"rrsets": batch})
+        except requests.RequestException as e:
+            logging.error("PATCH of %s RRsets into zone %s failed: %s", len(batch), zone_name, e)
+            errors.append((zone_name, e))
+    return errors
+
 def create_ipv4_ptr_record(zone_name, full_ptr_name, ptr_target):
-    if ptr_target and ptr_target.strip():
-        fqdn = ptr_target if ptr_target.endswith('.') else ptr_target + '.'
-        full_ptr_name = full_ptr_name if full_ptr_name.endswith('.') else full_ptr_name + '.'
-
-        rrset = {
-            "name": full_ptr_name,
-            "type": "PTR",
-            "ttl": 3600,
-            "changetype": "REPLACE",
-            "records": [{"content": fqdn, "disabled": False}]
-        }
-
-        if not rrset["records"]:
-            logging.info(f"⚠️ Skipping IPv4 PTR record creation for {full_ptr_name} → {fqdn} in zone {zone_name} due to empty records list.")
-            return
-        
-        logging.info(f"🔁 Adding IPv4 PTR {full_ptr_name} → {fqdn} in zone {zone_name}")
+    rrset = build_ptr_rrset(full_ptr_name, ptr_target)
+    if rrset:
+        logging.info("Adding IPv4 PTR %s → %s in zone %s", rrset['name'], rrset['records'][0]['content'], zone_name)
         api_patch(f"/zones/{zone_name}", {"rrsets": [rrset]})
 
 
 def create_ipv6_ptr_record(zone_name, full_ptr_name, ptr_target):
-    if ptr_target and ptr_target.strip():
-        fqdn = ptr_target if ptr_target.endswith('.') else ptr_target + '.'
-        full_ptr_name = full_ptr_name if full_ptr_name.endswith('.') else full_ptr_name + '.'
-
-        rrset = {
-            "name": full_ptr_name,
-            "type": "PTR",
-            "ttl": 3600,
-            "changetype": "REPLACE",
-            "records": [{"content": fqdn, "disabled": False}]
-        }
-
-        if not rrset["records"]:
-            logging.info(f"⚠️ Skipping IPv6 PTR record creation for {full_ptr_name} → {fqdn} in zone {zone_name} due to empty records list.")
-            return
-        
-        logging.info(f"🔁 Adding IPv6 PTR {full_ptr_name} → {fqdn} in zone {zone_name}")
+    rrset = build_ptr_rrset(full_ptr_name, ptr_target)
+    if rrset:
+        logging.info("Adding IPv6 PTR %s → %s in zone %s", rrset['name'], rrset['records'][0]['content'], zone_name)
         api_patch(f"/zones/{zone_name}", {"rrsets": [rrset]})
 
-def create_ipv4_ptr_records_from_students(students):
+def create_ipv4_ptr_records_from_students(students, batch_size=RRSET_BATCH_SIZE):
+    """PATCH the IPv4 PTR of every student into IPV4_PTR_ZONE. Returns the failed batches as (zone, error)."""
     logging.info("Creating **IPv4** PTR records for all students...")
-    ipv4_ptr_zone = "176.191.193.in-addr.arpa"
+    ipv4_ptr_zone = IPV4_PTR_ZONE
+    rrsets = {}
 
     for student in students:
         hostname = student.get("hostname")
@@ -248,32 +381,35 @@ def create_ipv4_ptr_records_from_students(students):
         ipv4 = student.get("ipv4")
 
         if not hostname or not dns_zone:
-            logging.warning(f"⚠️ Skipping student (missing hostname or dns_zone): {student}")
+            logging.warning("Skipping student (missing hostname or dns_zone): %s", student)
             continue
 
         ptr_target = f"mx.{dns_zone}"
 
         if not ptr_target or ptr_target.strip() == ".":
-            logging.warning(f"⚠️ Skipping PTR target creation due to invalid ptr_target: '{ptr_target}' for student: {student}")
+            logging.warning("Skipping PTR target creation due to invalid ptr_target: '%s' for student: %s", ptr_target, student)
             continue
 
         if ipv4:
             ptr_name = ipv4_to_arpa(ipv4)
             if not ptr_name:
-                logging.warning(f"⚠️ Skipping IPv4 PTR due to empty ptr_name for IP {ipv4}")
+                logging.warning("Skipping IPv4 PTR due to empty ptr_name for IP %s", ipv4)
             elif ptr_name.endswith(ipv4_ptr_zone):
-                logging.debug(f"Creating IPv4 PTR record: zone={ipv4_ptr_zone}, ptr_name={ptr_name}, ptr_target={ptr_target}")
-                try:
-                    create_ipv4_ptr_record(ipv4_ptr_zone, ptr_name, ptr_target)
-                except requests.HTTPError as e:
-                    logging.error(f"❌ Failed to create IPv4 PTR for {ipv4}: {e}")
+                rrset = build_ptr_rrset(ptr_name, ptr_target)
+                if rrset:
+                    logging.debug("Adding IPv4 PTR %s → %s in zone %s", rrset['name'], rrset['records'][0]['content'], ipv4_ptr_zone)
+                    rrsets[rrset["name"]] = rrset
             else:
-                logging.warning(f"⚠️ Skipping IPv4 PTR {ipv4}, doesn't match zone {ipv4_ptr_zone}")
+                logging.warning("Skipping IPv4 PTR %s, doesn't match zone %s", ipv4, ipv4_ptr_zone)
+
+    return patch_rrsets(ipv4_ptr_zone, list(rrsets.values()), batch_size)
 
 
-def create_ipv6_ptr_records_from_students(students):
+def create_ipv6_ptr_records_from_students(students, batch_size=RRSET_BATCH_SIZE):
+    """PATCH the IPv6 PTR of every student into IPV6_PTR_ZONE. Returns the failed batches as (zone, error)."""
     logging.info("Creating **IPv6** PTR records for all students...")
-    ipv6_ptr_zone = "a.0.8.8.2.8.a.6.0.1.0.0.2.ip6.arpa"
+    ipv6_ptr_zone = IPV6_PTR_ZONE
+    rrsets = {}
 
     for student in students:
         hostname = student.get("hostname")
@@ -281,68 +417,107 @@ def create_ipv6_ptr_records_from_students(students):
         ipv6 = student.get("ipv6")
 
         if not hostname or not dns_zone:
-            logging.warning(f"⚠️ Skipping student (missing hostname or dns_zone): {student}")
+            logging.warning("Skipping student (missing hostname or dns_zone): %s", student)
             continue
 
         if not ipv6:
-            logging.warning(f"⚠️ Skipping student with no IPv6 address: {student}")
+            logging.warning("Skipping student with no IPv6 address: %s", student)
             continue
 
         try:
             ptr_name = ipv6_to_arpa(ipv6)
         except Exception as e:
-            logging.warning(f"⚠️ Failed to convert IPv6 {ipv6} to PTR: {e}")
+            logging.warning("Failed to convert IPv6 %s to PTR: %s", ipv6, e)
             continue
 
         if not ptr_name or not ptr_name.endswith(ipv6_ptr_zone):
-            logging.warning(f"⚠️ Skipping IPv6 PTR {ipv6}, doesn't match zone {ipv6_ptr_zone}")
+            logging.warning("Skipping IPv6 PTR %s, doesn't match zone %s", ipv6, ipv6_ptr_zone)
             continue
 
         ptr_target = f"mx.{dns_zone}".strip()
         if not ptr_target or ptr_target == ".":
-            logging.warning(f"⚠️ Invalid ptr_target '{ptr_target}' for student: {student}")
+            logging.warning("Invalid ptr_target '%s' for student: %s", ptr_target, student)
             continue
 
-        logging.debug(f"Creating IPv6 PTR record: zone={ipv6_ptr_zone}, ptr_name={ptr_name}, ptr_target={ptr_target}")
-        try:
-            create_ipv6_ptr_record(ipv6_ptr_zone, ptr_name, ptr_target)
-        except requests.HTTPError as e:
-            logging.error(f"❌ Failed to create IPv6 PTR for {ipv6}: {e}")
-
-
-
-def execute_dns():
-    list_all_zones()
-    delete_all_sasm_zones()
-
-    exclude_pattern = r'(.*-.*|pieter|rudi)\.sasm\.uclllabs\.be'
-    clean_zones = [
-        "sasm.uclllabs.be",
-        "176.191.193.in-addr.arpa",
-        "a.0.8.8.2.8.a.6.0.1.0.0.2.ip6.arpa"
+        rrset = build_ptr_rrset(ptr_name, ptr_target)
+        if rrset:
+            logging.debug("Adding IPv6 PTR %s → %s in zone %s", rrset['name'], rrset['records'][0]['content'], ipv6_ptr_zone)
+            rrsets[rrset["name"]] = rrset
+
+    return patch_rrsets(ipv6_ptr_zone, list(rrsets.values()), batch_size)
+
+
+
+def load_students(path=STUDENTS_FILE, db_path=STUDENT_DB):
+    if db_path:
+        store = open_store(db_path, path)
+        students = store.all()
+        store.close()
+        logging.info("Loaded %s students from %s", len(students), db_path)
+        return students
+
+    if not os.path.exists(path):
+        logging.error("File %s not found.", path)
+        return None
+
+    students = load_processed_students(path)
+
+    logging.info("Loaded %s students from %s", len(students), path)
+    return students
+
+def _raise_on(errors, what):
+    """Fail the calling pipeline stage when a helper reported failed writes."""
+    if errors:
+        target, error = errors[0]
+        raise RuntimeError(f"{what}: {len(errors)} failed, first {target}: {error}")
+
+def execute_dns(students=None):
+    """Rebuild all student DNS as a stage graph and return the per-stage report.
+
+    Cleanup of each managed zone, zone deletion and loading the students run in
+    parallel; slave zones, NS/glue and PTR records each start as soon as the
+    zones they touch are clean, so the run takes as long as the critical path.
+    Students default to processed_Emails.json (or the store).
+    """
+    state = {}
+
+    def load():
+        state["students"] = students if students is not None else load_students()
+        if state["students"] is None:
+            raise FileNotFoundError(STUDENTS_FILE)
+
+    def clean(zone):
+        return lambda: _raise_on(update_zone_remove_ns_ds(zone, EXCLUDE_PATTERN), f"Cleaning zone {zone}")
+
+    def add_slave_zones():
+        errors = create_slave_zones_from_students(state["students"], existing=state["zones"])
+        _raise_on(errors, "Creating slave zones")
+
+    def add_ns_glue():
+        logging.info("Adding NS records and glue A/AAAA to parent zone %s...", PARENT_ZONE)
+        _raise_on(add_ns_records_parent_zone_from_students(state["students"]), "Adding NS and glue records")
+
+    def add_ipv6_ptr():
+        logging.info("Creating IPV6 PTR records for all students...")
+        _raise_on(create_ipv6_ptr_records_from_students(state["students"]), "Creating IPv6 PTR records")
+
+    stages = [
+        Stage("load_students", load),
+        Stage("delete_zones", lambda: state.update(zones=delete_all_sasm_zones())),
+        Stage("clean_parent", clean(PARENT_ZONE)),
+        Stage("clean_ipv4_ptr", clean(IPV4_PTR_ZONE)),
+        Stage("clean_ipv6_ptr", clean(IPV6_PTR_ZONE)),
+        Stage("verify_zones", lambda: verify_zones([PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE]),
+              ["clean_parent", "clean_ipv4_ptr", "clean_ipv6_ptr"]),
+        Stage("slave_zones", add_slave_zones, ["load_students", "delete_zones"]),
+        Stage("ns_glue", add_ns_glue, ["load_students", "clean_parent"]),
+        # Stage("ipv4_ptr", lambda: create_ipv4_ptr_records_from_students(state["students"]),
+        #       ["load_students", "clean_ipv4_ptr"]),
+        Stage("ipv6_ptr", add_ipv6_ptr, ["load_students", "clean_ipv6_ptr"]),
     ]
-    for zone in clean_zones:
-        update_zone_remove_ns_ds(zone, exclude_pattern)
-
-    verify_zones(clean_zones)
-
-    try:
-        with open('Output/processed_Emails.json', 'r', encoding='utf-8') as f:
-            students = json.load(f)
-    except FileNotFoundError:
-        logging.error("File processed_Emails.json not found.")
-        return
-    
-    logging.info(f"Loaded {len(students)} students from processed_Emails.json")
-    create_slave_zones_from_students(students)
-
-    logging.info("Adding NS records and glue A/AAAA to parent zone sasm.uclllabs.be...")
-    add_ns_records_parent_zone_from_students(students)
-
-    # logging.info("🧠 Creating IPV4 PTR records for all students...")
-    # create_ipv4_ptr_records_from_students(students)
-
-    logging.info("🧠 Creating IPV6 PTR records for all students...")
-    create_ipv6_ptr_records_from_students(students)
+    report = run_stages(stages)
 
+    for name, stage in report.items():
+        logging.info("Stage %s: %s in %s s", name, stage['status'], stage['seconds'])
     logging.info("-" * 60)
+    return report
@@ -0,0 +1,202 @@
+import asyncio
+import random
+import struct
+import time
+from dataclasses import dataclass, field
+from config import DNS_PROBE_TIMEOUT, DNS_PROBE_RETRIES, DNS_PROBE_CONCURRENCY
+
+TYPE_NS = 2
+TYPE_SOA = 6
+CLASS_IN = 1
+RCODES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED", 9: "NOTAUTH"}
+
+# --- DNS wire format (RFC 1035), just enough for SOA and NS lookups ---
+
+def encode_name(name):
+    labels = [label for label in name.rstrip('.').split('.') if label]
+    return b"".join(struct.pack("B", len(l)) + l.encode("ascii") for l in labels) + b"\0"
+
+def decode_name(data, offset):
+    """Read a possibly compressed name at offset. Returns (name with trailing dot, offset after it)."""
+    labels = []
+    end = None
+    for _ in range(128):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack_from("!H", data, offset)[0] & 0x3FFF
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode("ascii", "replace"))
+        offset += length
+    else:
+        raise ValueError("Name compression loop")
+    return ".".join(labels).lower() + ".", end if end is not None else offset
+
+def build_query(query_id, qname, qtype):
+    # Flags 0: a plain non-recursive query, which is what an authoritative server expects
+    return struct.pack("!HHHHHH", query_id, 0, 1, 0, 0, 0) + encode_name(qname) + struct.pack("!HH", qtype, CLASS_IN)
+
+def parse_response(data):
+    """Header fields and the answer section of a DNS response.
+
+    SOA answers become {"serial", "mname"}, NS answers the target name, anything else raw bytes.
+    """
+    query_id, flags, qdcount, ancount, _, _ = struct.unpack_from("!HHHHHH", data, 0)
+    offset = 12
+    question = None
+    for _ in range(qdcount):
+        qname, offset = decode_name(data, offset)
+        qtype, _ = struct.unpack_from("!HH", data, offset)
+        offset += 4
+        question = (qname, qtype)
+
+    answers = []
+    for _ in range(ancount):
+        name, offset = decode_name(data, offset)
+        rtype, _, ttl, rdlength = struct.unpack_from("!HHIH", data, offset)
+        offset += 10
+        rdata_start = offset
+        if rtype == TYPE_SOA:
+            mname, pos = decode_name(data, rdata_start)
+            _, pos = decode_name(data, pos)
+            serial = struct.unpack_from("!I", data, pos)[0]
+            value = {"mname": mname, "serial": serial}
+        elif rtype == TYPE_NS:
+            value = decode_name(data, rdata_start)[0]
+        else:
+            value = data[rdata_start:rdata_start + rdlength]
+        answers.append((name, rtype, ttl, value))
+        offset = rdata_start + rdlength
+
+    return {
+        "id": query_id,
+        "question": question,
+        "aa": bool(flags & 0x0400),
+        "tc": bool(flags & 0x0200),
+        "rcode": RCODES.get(flags & 0x000F, str(flags & 0x000F)),
+        "answers": answers
+    }
+
+# --- asyncio UDP client ---
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    """One UDP socket for many outstanding queries, matched to their futures by id and question."""
+
+    def __init__(self):
+        self.transport = None
+        self.pending = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            response = parse_response(data)
+        except (ValueError, IndexError, struct.error):
+            return
+        future = self.pending.get((response["id"], response["question"]))
+        if future is not None and not future.done():
+            future.set_result(response)
+
+    def error_received(self, exc):
+        # An ICMP error cannot be tied to one query on a shared socket; the query times out instead
+        pass
+
+class DnsProber:
+    """Sends SOA/NS queries to DNS servers over one UDP socket per address family.
+
+    At most concurrency queries are in flight; each query waits timeout seconds
+    for an answer and is resent up to retries times.
+    """
+
+    def __init__(self, timeout=DNS_PROBE_TIMEOUT, retries=DNS_PROBE_RETRIES, concurrency=DNS_PROBE_CONCURRENCY):
+        self.timeout = timeout
+        self.retries = retries
+        self.concurrency = concurrency
+        self._protocols = {}
+        self._semaphore = None
+        self._socket_lock = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._socket_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc):
+        for protocol in self._protocols.values():
+            protocol.transport.close()
+        self._protocols.clear()
+
+    async def _protocol(self, server):
+        family = "ipv6" if ":" in server[0] else "ipv4"
+        # Locked so concurrent first queries wait for one socket instead of each opening their own
+        async with self._socket_lock:
+            if family not in self._protocols:
+                local = ("::", 0) if family == "ipv6" else ("0.0.0.0", 0)
+                _, protocol = await asyncio.get_running_loop().create_datagram_endpoint(
+                    _ProbeProtocol, local_addr=local)
+                self._protocols[family] = protocol
+        return self._protocols[family]
+
+    async def query(self, server, qname, qtype):
+        """Response dict for (qname, qtype) from server=(host, port); raises TimeoutError after all retries."""
+        qname = qname.rstrip('.').lower() + "."
+        async with self._semaphore:
+            protocol = await self._protocol(server)
+            for _ in range(self.retries + 1):
+                key = None
+                while key is None or key in protocol.pending:
+                    key = (random.randrange(1 << 16), (qname, qtype))
+                future = asyncio.get_running_loop().create_future()
+                protocol.pending[key] = future
+                try:
+                    protocol.transport.sendto(build_query(key[0], qname, qtype), server)
+                    return await asyncio.wait_for(future, self.timeout)
+                except asyncio.TimeoutError:
+                    continue
+                finally:
+                    protocol.pending.pop(key, None)
+        raise TimeoutError(f"timed out after {self.retries + 1} tries")
+
+@dataclass
+class ZoneProbe:
+    """What one server answered for a zone's SOA and NS."""
+    zone: str
+    server: str
+    rcode: str = None
+    authoritative: bool = False
+    serial: int = None
+    ns: list = field(default_factory=list)
+    error: str = None
+    duration_ms: float = 0.0
+
+async def probe_zone(prober, server, zone):
+    start = time.perf_counter()
+    result = ZoneProbe(zone, server[0])
+    try:
+        soa = await prober.query(server, zone, TYPE_SOA)
+        result.rcode = soa["rcode"]
+        result.authoritative = soa["aa"]
+        serials = [value["serial"] for _, rtype, _, value in soa["answers"] if rtype == TYPE_SOA]
+        result.serial = serials[0] if serials else None
+        if result.rcode == "NOERROR":
+            ns = await prober.query(server, zone, TYPE_NS)
+            result.ns = sorted(value for _, rtype, _, value in ns["answers"] if rtype == TYPE_NS)
+    except (OSError, TimeoutError) as e:
+        result.error = str(e) or type(e).__name__
+    result.duration_ms = (time.perf_counter() - start) * 1000
+    return result
+
+async def probe_zones_async(targets, timeout=DNS_PROBE_TIMEOUT, retries=DNS_PROBE_RETRIES,
+                            concurrency=DNS_PROBE_CONCURRENCY):
+    """Probe every (server, zone) in targets concurrently. server is a (host, port) tuple."""
+    async with DnsProber(timeout, retries, concurrency) as prober:
+        return await asyncio.gather(*(probe_zone(prober, server, zone) for server, zone in targets))
+
+def probe_zones(targets, **kwargs):
+    """Blocking wrapper around probe_zones_async; returns ZoneProbes in the order of targets."""
+    return asyncio.run(probe_zones_async(list(targets), **kwargs))
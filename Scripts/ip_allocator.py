@@ -0,0 +1,146 @@
+import ipaddress
+from collections import deque
+from config import ADDRESS_POOLS, POOL_FIRST_HOST, POOL_LAST_HOST
+
+class AddressPool:
+    """Bitmap of paired IPv4/IPv6 addresses in one subnet.
+
+    Host number N of ipv4_network is paired with the IPv6 address whose suffix
+    repeats N's decimal digits (193.191.176.14 <-> 2001:6a8:2880:a020::14), which
+    is how the existing allocations were made. Hosts first_host..last_host are
+    handed out; released hosts go on a free list and are reused first.
+    """
+
+    def __init__(self, ipv4_network, ipv6_prefix, first_host=POOL_FIRST_HOST, last_host=POOL_LAST_HOST):
+        self.ipv4_network = ipaddress.IPv4Network(ipv4_network)
+        self.ipv6_network = ipaddress.IPv6Network(ipv6_prefix)
+        self.first_host = first_host
+        self.last_host = min(last_host, self.ipv4_network.num_addresses - 2)
+        self.size = max(0, self.last_host - first_host + 1)
+        self._bitmap = bytearray((self.size + 7) // 8)
+        self._free = deque()
+        self._cursor = 0
+        self.used = 0
+
+    def _slot(self, ipv4):
+        """Bitmap slot of ipv4, or None if it is not handed out by this pool."""
+        ip = ipaddress.IPv4Address(ipv4)
+        if ip not in self.ipv4_network:
+            return None
+        host = int(ip) - int(self.ipv4_network.network_address)
+        if not self.first_host <= host <= self.last_host:
+            return None
+        return host - self.first_host
+
+    def _is_set(self, slot):
+        return self._bitmap[slot >> 3] & (1 << (slot & 7))
+
+    def _set(self, slot):
+        self._bitmap[slot >> 3] |= 1 << (slot & 7)
+        self.used += 1
+
+    def _clear(self, slot):
+        self._bitmap[slot >> 3] &= ~(1 << (slot & 7))
+        self.used -= 1
+
+    def pair(self, slot):
+        host = self.first_host + slot
+        ipv4 = self.ipv4_network.network_address + host
+        ipv6 = self.ipv6_network.network_address + int(str(host), 16)
+        return str(ipv4), str(ipv6)
+
+    def contains(self, ipv4):
+        return self._slot(ipv4) is not None
+
+    def is_used(self, ipv4):
+        slot = self._slot(ipv4)
+        return slot is not None and bool(self._is_set(slot))
+
+    def mark_used(self, ipv4):
+        """Reserve an address that is already assigned. Returns False if it was already reserved."""
+        slot = self._slot(ipv4)
+        if slot is None or self._is_set(slot):
+            return False
+        self._set(slot)
+        return True
+
+    def allocate(self):
+        """Next free (ipv4, ipv6) pair, or None when the pool is full."""
+        while self._free:
+            slot = self._free.popleft()
+            if not self._is_set(slot):
+                self._set(slot)
+                return self.pair(slot)
+        while self._cursor < self.size:
+            slot = self._cursor
+            self._cursor += 1
+            if not self._is_set(slot):
+                self._set(slot)
+                return self.pair(slot)
+        return None
+
+    def release(self, ipv4):
+        """Return an address to the pool. Returns False if it was not allocated here."""
+        slot = self._slot(ipv4)
+        if slot is None or not self._is_set(slot):
+            return False
+        self._clear(slot)
+        self._free.append(slot)
+        return True
+
+    def available(self):
+        return self.size - self.used
+
+class AddressAllocator:
+    """Hands out paired addresses from several pools, filling them in order."""
+
+    def __init__(self, pools):
+        self.pools = list(pools)
+
+    def _pool_for(self, ipv4):
+        for pool in self.pools:
+            if pool.contains(ipv4):
+                return pool
+        return None
+
+    def mark_used(self, ipv4):
+        """Reserve an existing address. Returns False for duplicates; addresses outside every pool are ignored."""
+        pool = self._pool_for(ipv4)
+        return pool.mark_used(ipv4) if pool else True
+
+    def is_used(self, ipv4):
+        pool = self._pool_for(ipv4)
+        return pool is not None and pool.is_used(ipv4)
+
+    def allocate(self):
+        for pool in self.pools:
+            pair = pool.allocate()
+            if pair:
+                return pair
+        raise ValueError("Not enough IP addresses left in the configured address pools")
+
+    def release(self, ipv4):
+        pool = self._pool_for(ipv4)
+        return pool.release(ipv4) if pool else False
+
+    def available(self):
+        return sum(pool.available() for pool in self.pools)
+
+def parse_pools(spec=ADDRESS_POOLS, first_host=POOL_FIRST_HOST, last_host=POOL_LAST_HOST):
+    """Parse "ipv4_network=ipv6_prefix,..." into AddressPools."""
+    pools = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        ipv4_network, ipv6_prefix = item.split("=", 1)
+        pools.append(AddressPool(ipv4_network.strip(), ipv6_prefix.strip(), first_host, last_host))
+    return pools
+
+def build_allocator(entries=(), spec=ADDRESS_POOLS):
+    """Allocator over the configured pools with the addresses of entries already reserved."""
+    allocator = AddressAllocator(parse_pools(spec))
+    for entry in entries:
+        if not allocator.mark_used(entry["ipv4"]):
+            print(f"Warning: duplicate address {entry['ipv4']} for {entry.get('original_email')}")
+    return allocator
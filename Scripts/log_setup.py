@@ -0,0 +1,95 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOG_FILE, LOG_LEVEL, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_stage = contextvars.ContextVar("log_stage", default=None)
+_listener = None
+
+@contextmanager
+def log_stage(name):
+    """Tag every record logged inside the block (and in threads started via run_bounded) with stage name."""
+    token = _stage.set(name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+class _ContextFilter(logging.Filter):
+    """Adds run_id and stage to records in the logging thread, before they are queued."""
+
+    def __init__(self, run_id):
+        super().__init__()
+        self.run_id = run_id
+
+    def filter(self, record):
+        record.run_id = self.run_id
+        record.stage = _stage.get()
+        return True
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "run_id": getattr(record, "run_id", None),
+            "stage": getattr(record, "stage", None),
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def setup_logging(log_file=LOG_FILE, level=LOG_LEVEL, fmt=LOG_FORMAT, max_bytes=LOG_MAX_BYTES,
+                  backup_count=LOG_BACKUP_COUNT, run_id=None):
+    """Send all logging to a size-rotated file through a background thread. Call once per entry point.
+
+    Callers only put records on a queue; a QueueListener thread formats and writes
+    them. fmt is "text" (the classic one-line format) or "json" (one JSON object
+    per line with run_id and stage). Returns the run_id.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener.run_id
+
+    directory = os.path.dirname(log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    run_id = run_id or uuid.uuid4().hex[:12]
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter(run_id))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler)
+    _listener.run_id = run_id
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return run_id
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
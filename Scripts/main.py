@@ -1,6 +1,13 @@
 from student_scraper import fetch_student_data
 from process_students import process_emails
-from create_dns import execute_dns
+from create_dns import execute_dns, STUDENTS_FILE
+from reconcile_dns import reconcile_dns
+from student_store import open_store
+from metrics import export_metrics
+from log_setup import setup_logging
+from config import DNS_MODE, STUDENT_DB
+
+setup_logging()
 
 data = fetch_student_data()
 
@@ -10,7 +17,13 @@ for student in data['students']:
     if student['email'] != "pieter.geens@ucll.be":
         emails.append(student['email'])
 
-test = process_emails(emails)
+store = open_store(STUDENT_DB, STUDENTS_FILE) if STUDENT_DB else None
+test = process_emails(emails, store=store)
+
+if DNS_MODE == "reconcile":
+    reconcile_dns(test)
+else:
+    execute_dns()
+# verify_dns_changes(emails)
 
-execute_dns()
-# verify_dns_changes(emails)
\ No newline at end of file
+export_metrics()
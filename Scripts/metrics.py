@@ -0,0 +1,180 @@
+import logging
+import re
+import threading
+from collections import defaultdict
+from atomic_file import write_atomic, write_json_atomic
+from config import METRICS_JSON_FILE, METRICS_PROM_FILE
+
+# Latency buckets in seconds (Prometheus "le" bounds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# /zones/<anything> → /zones/{zone}, so per-zone calls aggregate into one series
+_PATH_TEMPLATES = [
+    (re.compile(r"^/zones/[^/]+/rrsets$"), "/zones/{zone}/rrsets"),
+    (re.compile(r"^/zones/[^/]+$"), "/zones/{zone}"),
+]
+
+def path_template(path):
+    path = path.split("?", 1)[0]
+    for pattern, template in _PATH_TEMPLATES:
+        if pattern.match(path):
+            return template
+    return path
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bucket bound holding the q-th quantile (max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        for bound, cumulative in zip(self.buckets, self.counts):
+            if cumulative >= target:
+                return bound
+        return self.max
+
+class ApiMetrics:
+    """Thread-safe counters and latency histograms per API call.
+
+    Series are keyed by (method, path template). Every call counts towards its
+    status (an HTTP code, or the exception name when no response came back),
+    bytes sent/received and retries; failed calls are also counted by error.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)        # (method, template, status) → count
+            self.errors = defaultdict(int)          # (method, template, error) → count
+            self.bytes_sent = defaultdict(int)      # (method, template) → bytes
+            self.bytes_received = defaultdict(int)  # (method, template) → bytes
+            self.retries = defaultdict(int)         # (method, template) → retries
+            self.latency = {}                       # (method, template) → Histogram
+
+    def record(self, method, path, status, seconds, bytes_sent=0, bytes_received=0, retries=0, error=None):
+        key = (method, path_template(path))
+        with self._lock:
+            self.requests[(*key, str(status))] += 1
+            if error:
+                self.errors[(*key, error)] += 1
+            self.bytes_sent[key] += bytes_sent
+            self.bytes_received[key] += bytes_received
+            self.retries[key] += retries
+            if key not in self.latency:
+                self.latency[key] = Histogram(self.buckets)
+            self.latency[key].observe(seconds)
+
+    def summary(self):
+        """Per-call totals as a JSON-serialisable dict."""
+        with self._lock:
+            calls = {}
+            for (method, template), hist in sorted(self.latency.items()):
+                key = (method, template)
+                calls[f"{method} {template}"] = {
+                    "count": hist.count,
+                    "statuses": {s: n for (m, t, s), n in self.requests.items() if (m, t) == key},
+                    "errors": {e: n for (m, t, e), n in self.errors.items() if (m, t) == key},
+                    "retries": self.retries[key],
+                    "bytes_sent": self.bytes_sent[key],
+                    "bytes_received": self.bytes_received[key],
+                    "latency_ms": {
+                        "avg": round(hist.sum / hist.count * 1000, 2) if hist.count else 0.0,
+                        "p50": round(hist.quantile(0.5) * 1000, 2),
+                        "p99": round(hist.quantile(0.99) * 1000, 2),
+                        "max": round(hist.max * 1000, 2),
+                        "total": round(hist.sum * 1000, 2)
+                    }
+                }
+            return {
+                "requests": sum(self.requests.values()),
+                "errors": sum(self.errors.values()),
+                "calls": calls
+            }
+
+    def prometheus(self, prefix="sasm_pdns_api"):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        def sample(name, labels, value):
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{prefix}_{name}{{{label_text}}} {value}")
+
+        with self._lock:
+            header("requests_total", "counter", "PowerDNS API requests by method, path and status.")
+            for (method, template, status), n in sorted(self.requests.items()):
+                sample("requests_total", {"method": method, "path": template, "status": status}, n)
+
+            header("errors_total", "counter", "Failed PowerDNS API requests by error.")
+            for (method, template, error), n in sorted(self.errors.items()):
+                sample("errors_total", {"method": method, "path": template, "error": error}, n)
+
+            header("retries_total", "counter", "Retries of idempotent PowerDNS API requests.")
+            for (method, template), n in sorted(self.retries.items()):
+                sample("retries_total", {"method": method, "path": template}, n)
+
+            header("bytes_total", "counter", "Request and response body bytes.")
+            for (method, template), n in sorted(self.bytes_sent.items()):
+                sample("bytes_total", {"method": method, "path": template, "direction": "sent"}, n)
+            for (method, template), n in sorted(self.bytes_received.items()):
+                sample("bytes_total", {"method": method, "path": template, "direction": "received"}, n)
+
+            header("request_duration_seconds", "histogram", "PowerDNS API request latency.")
+            for (method, template), hist in sorted(self.latency.items()):
+                labels = {"method": method, "path": template}
+                for bound, cumulative in zip(hist.buckets, hist.counts):
+                    sample("request_duration_seconds_bucket", {**labels, "le": str(bound)}, cumulative)
+                sample("request_duration_seconds_bucket", {**labels, "le": "+Inf"}, hist.count)
+                sample("request_duration_seconds_sum", labels, round(hist.sum, 6))
+                sample("request_duration_seconds_count", labels, hist.count)
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        write_json_atomic(path, self.summary(), indent=2)
+
+    def write_prometheus(self, path):
+        # The textfile collector may read at any moment, so never expose a half-written file
+        write_atomic(path, self.prometheus())
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+_metrics = ApiMetrics()
+
+def get_metrics():
+    """The process-wide metrics every PowerDNSClient records into by default."""
+    return _metrics
+
+def export_metrics(json_path=METRICS_JSON_FILE, prom_path=METRICS_PROM_FILE, metrics=None):
+    """Write the JSON summary and the Prometheus textfile (empty paths are skipped)."""
+    metrics = metrics or _metrics
+    if json_path:
+        metrics.write_json(json_path)
+    if prom_path:
+        metrics.write_prometheus(prom_path)
+    summary = metrics.summary()
+    logging.info("%s PowerDNS API requests, %s errors", summary['requests'], summary['errors'])
+    return summary
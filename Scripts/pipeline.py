@@ -0,0 +1,83 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from log_setup import log_stage
+
+class Stage:
+    """A named pipeline step that may start once all stages in deps have succeeded."""
+
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+def _check_graph(stages):
+    names = {stage.name for stage in stages}
+    if len(names) != len(stages):
+        raise ValueError("Duplicate stage names")
+    for stage in stages:
+        unknown = set(stage.deps) - names
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {', '.join(sorted(unknown))}")
+
+    # Kahn's algorithm: every stage must become ready at some point
+    remaining = {stage.name: set(stage.deps) for stage in stages}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages {', '.join(sorted(remaining))}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+def run_stages(stages, max_workers=None):
+    """Run stages as a dependency graph, starting every stage as soon as its deps are done.
+
+    Independent stages run concurrently, so the total time follows the critical
+    path. A failed stage is logged and all stages depending on it are skipped.
+    Returns {name: {"status": "ok"|"failed"|"skipped", "seconds": float, "error": str|None}}
+    in the order the stages were given.
+    """
+    _check_graph(stages)
+    by_name = {stage.name: stage for stage in stages}
+    report = {stage.name: {"status": "pending", "seconds": 0.0, "error": None} for stage in stages}
+
+    def run(stage):
+        start = time.perf_counter()
+        try:
+            with log_stage(stage.name):
+                stage.func()
+        finally:
+            report[stage.name]["seconds"] = round(time.perf_counter() - start, 3)
+
+    pending = set(by_name)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1) as pool:
+        while pending or running:
+            for name in sorted(pending):
+                deps = [report[dep]["status"] for dep in by_name[name].deps]
+                if any(status in ("failed", "skipped") for status in deps):
+                    report[name]["status"] = "skipped"
+                    logging.warning("Stage %s skipped because a dependency failed", name)
+                    pending.discard(name)
+                elif all(status == "ok" for status in deps):
+                    logging.info("Stage %s started", name)
+                    running[pool.submit(run, by_name[name])] = name
+                    report[name]["status"] = "running"
+                    pending.discard(name)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    report[name]["status"] = "ok"
+                    logging.info("Stage %s finished in %s s", name, report[name]['seconds'])
+                else:
+                    report[name]["status"] = "failed"
+                    report[name]["error"] = repr(error)
+                    logging.error("Stage %s failed after %s s: %r", name, report[name]['seconds'], error)
+    return report
@@ -1,43 +1,22 @@
-import json
-import os
-
-def process_emails(new_email_list, output_file="Output/processed_Emails.json"):
-    # Load existing data if exists
-    if os.path.exists(output_file):
-        with open(output_file, "r") as f:
-            existing_data = json.load(f)
-    else:
-        existing_data = []
-
-    # Get set of emails already processed for quick lookup
-    processed_emails = {entry["original_email"] for entry in existing_data}
-
-    # Filter new emails that are not in existing data
-    unique_new_emails = [email for email in new_email_list if email not in processed_emails]
+from allocation_journal import AllocationJournal
+from ip_allocator import build_allocator
+from config import PARENT_ZONE, ADDRESS_POOLS
 
+def build_entries(new_emails, allocator, parent_zone=PARENT_ZONE):
+    """Sort new emails by last name and give each one a hostname, zone and address pair."""
     # Sort new emails by last name (first word after dot)
-    sorted_new_emails = sorted(unique_new_emails, key=lambda email: email.split('@')[0].split('.')[1])
+    sorted_new_emails = sorted(new_emails, key=lambda email: email.split('@')[0].split('.')[1])
 
-    # Find the next available IP index (starting at 5)
-    if existing_data:
-        last_ipv4 = existing_data[-1]["ipv4"]
-        last_index = int(last_ipv4.split('.')[-1])
-        start_index = last_index + 1
-    else:
-        start_index = 5
+    if len(sorted_new_emails) > allocator.available():
+        raise ValueError("Too many emails; not enough IP addresses in the configured address pools")
 
-    if start_index + len(sorted_new_emails) - 1 > 253:
-        raise ValueError("Too many emails; not enough IP addresses in range 5-253")
-
-    # Process new emails
     new_entries = []
-    for i, email in enumerate(sorted_new_emails):
+    for email in sorted_new_emails:
         name_part = email.split('@')[0]
         first_name, last_name = name_part.split('.')
 
-        dns_zone_name = f"{first_name}-{last_name}.sasm.uclllabs.be"
-        ipv4 = f"193.191.176.{start_index + i}"
-        ipv6 = f"2001:6a8:2880:a020::{start_index + i}"
+        dns_zone_name = f"{first_name}-{last_name}.{parent_zone}"
+        ipv4, ipv6 = allocator.allocate()
         hostname = f"{first_name}-{last_name}"
 
         new_entries.append({
@@ -47,15 +26,67 @@ def process_emails(new_email_list, output_file="Output/processed_Emails.json"):
             "ipv4": ipv4,
             "ipv6": ipv6
         })
+    return new_entries
+
+def process_emails(new_email_list, output_file="Output/processed_Emails.json", store=None,
+                   parent_zone=PARENT_ZONE, address_pools=ADDRESS_POOLS):
+    """Assign a zone and addresses to every new email and persist them.
+
+    With a StudentStore the new entries are inserted in one transaction.
+    Otherwise they are appended to the allocation journal next to output_file,
+    which is compacted back into output_file every JOURNAL_COMPACT_EVERY records.
+    """
+    if store is not None:
+        return _process_emails_store(new_email_list, store, parent_zone, address_pools)
+
+    # Load the snapshot plus the journal of changes since
+    journal = AllocationJournal(output_file)
+    existing_data = journal.load()
+
+    # Get set of emails already processed for quick lookup
+    processed_emails = {entry["original_email"] for entry in existing_data}
+
+    # Filter new emails that are not in existing data
+    unique_new_emails = [email for email in new_email_list if email not in processed_emails]
+
+    # Reserve the addresses already in use; freed ones are handed out again
+    allocator = build_allocator(existing_data, address_pools)
+    new_entries = build_entries(unique_new_emails, allocator, parent_zone)
 
     # Combine old and new data
     updated_data = existing_data + new_entries
 
-    # Ensure output folder exists
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-    # Write back to file
-    with open(output_file, "w") as f:
-        json.dump(updated_data, f, indent=4)
+    # Only the new allocations are written
+    journal.record_allocations(new_entries)
+    journal.maybe_compact(updated_data)
 
     return updated_data
+
+def _process_emails_store(new_email_list, store, parent_zone, address_pools):
+    unique_new_emails = [email for email in dict.fromkeys(new_email_list) if not store.has_email(email)]
+    if unique_new_emails:
+        allocator = build_allocator(({"ipv4": ipv4} for ipv4 in store.ipv4_addresses()), address_pools)
+        store.add_many(build_entries(unique_new_emails, allocator, parent_zone))
+    return store.all()
+
+def release_emails(emails, output_file="Output/processed_Emails.json", store=None):
+    """Remove students from the processed list so their addresses can be reused. Returns the removed entries."""
+    if store is not None:
+        return store.remove_emails(emails)
+
+    journal = AllocationJournal(output_file)
+    existing_data = journal.load()
+
+    emails = set(emails)
+    removed = [entry for entry in existing_data if entry["original_email"] in emails]
+    if not removed:
+        return []
+
+    journal.record_releases([entry["original_email"] for entry in removed])
+    journal.maybe_compact([entry for entry in existing_data if entry["original_email"] not in emails])
+
+    return removed
+
+def load_students(output_file="Output/processed_Emails.json"):
+    """Processed students from the snapshot with the journal replayed on top."""
+    return AllocationJournal(output_file).load()
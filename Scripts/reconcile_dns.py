@@ -0,0 +1,263 @@
+import logging
+import re
+import requests
+from api_helper import api_get, api_post, api_put, api_delete
+from concurrency import run_bounded
+from config import DNS_MAX_WORKERS
+from zone_cache import fetch_zone, zone_serial
+from create_dns import (
+    PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE, NS_TARGETS, EXCLUDE_PATTERN,
+    load_students, patch_rrsets, ipv4_to_arpa, ipv6_to_arpa
+)
+
+TTL = 3600
+
+def _fqdn(name):
+    return name if name.endswith('.') else name + '.'
+
+def _rrset(name, rtype, contents):
+    return {
+        "name": name,
+        "type": rtype,
+        "ttl": TTL,
+        "records": [{"content": c, "disabled": False} for c in sorted(contents)]
+    }
+
+def _record_set(rrset):
+    return {(r["content"], r.get("disabled", False)) for r in rrset.get("records", [])}
+
+def _same_rrset(current, desired):
+    return current.get("ttl") == desired["ttl"] and _record_set(current) == _record_set(desired)
+
+def _owned_by(rrset, zones):
+    """True if the rrset belongs to (or points into) one of the given zone FQDNs."""
+    name = rrset["name"]
+    for zone in zones:
+        if name == zone or name.endswith("." + zone):
+            return True
+        if rrset["type"] == "PTR" and any(r["content"].endswith("." + zone) for r in rrset.get("records", [])):
+            return True
+    return False
+
+def build_desired_state(students, include_ipv4_ptr=False, parent_zone=PARENT_ZONE,
+                        ipv4_ptr_zone=IPV4_PTR_ZONE, ipv6_ptr_zone=IPV6_PTR_ZONE):
+    """Translate processed students into the zones and rrsets that should exist.
+
+    Returns {"zones": {fqdn: {"kind", "masters"}}, "rrsets": {zone: {(name, type): rrset}}}.
+    IPv4 PTR records are opt-in, matching execute_dns.
+    """
+    zones = {}
+    rrsets = {zone: {} for zone in (parent_zone, ipv4_ptr_zone, ipv6_ptr_zone)}
+
+    for student in students:
+        dns_zone = student.get("dns_zone")
+        ipv4 = student.get("ipv4")
+        ipv6 = student.get("ipv6")
+        if not dns_zone or not ipv4 or not ipv6:
+            logging.warning("Skipping student with incomplete data: %s", student)
+            continue
+
+        zone_fqdn = _fqdn(dns_zone)
+        ns_name = f"ns.{zone_fqdn}"
+        ptr_target = f"mx.{zone_fqdn}"
+        zones[zone_fqdn] = {"kind": "Slave", "masters": [ipv4, ipv6]}
+
+        parent = rrsets[parent_zone]
+        parent[(zone_fqdn, "NS")] = _rrset(zone_fqdn, "NS", [*NS_TARGETS, ns_name])
+        parent[(ns_name, "A")] = _rrset(ns_name, "A", [ipv4])
+        parent[(ns_name, "AAAA")] = _rrset(ns_name, "AAAA", [ipv6])
+
+        ptr6 = _fqdn(ipv6_to_arpa(ipv6))
+        rrsets[ipv6_ptr_zone][(ptr6, "PTR")] = _rrset(ptr6, "PTR", [ptr_target])
+        if include_ipv4_ptr:
+            ptr4 = _fqdn(ipv4_to_arpa(ipv4))
+            rrsets[ipv4_ptr_zone][(ptr4, "PTR")] = _rrset(ptr4, "PTR", [ptr_target])
+
+    return {"zones": zones, "rrsets": rrsets}
+
+def build_current_state(listing, zone_bodies):
+    """Index a /zones listing and full zone bodies the same way as build_desired_state."""
+    zones = {
+        z["name"]: {"kind": z.get("kind"), "masters": list(z.get("masters") or [])}
+        for z in listing
+    }
+    rrsets = {
+        zone: {(r["name"], r["type"]): r for r in body.get("rrsets", [])}
+        for zone, body in zone_bodies.items()
+    }
+    return {"zones": zones, "rrsets": rrsets}
+
+def fetch_current_state(rrset_zones=(PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE)):
+    """Fetch the zone listing and each managed zone body exactly once."""
+    listing = api_get("/zones")
+    serials = {z["name"].rstrip('.'): zone_serial(z) for z in listing}
+    bodies = {}
+    for zone in rrset_zones:
+        serial = serials.get(zone.rstrip('.'))
+        # Unlisted zones do not exist; listed ones come from the zone cache while their serial holds
+        body = fetch_zone(zone, serial=serial) if serial else None
+        if body:
+            bodies[zone] = body
+    return build_current_state(listing, bodies)
+
+def compute_diff(desired, current, exclude_pattern=EXCLUDE_PATTERN, parent_zone=PARENT_ZONE):
+    """Compute the minimal set of writes that turns current into desired.
+
+    Zones under the parent zone that are not desired are deleted, like
+    delete_all_sasm_zones does. Zones whose masters changed are updated in place,
+    zones of a different kind are recreated. For each managed zone, rrsets that
+    differ are REPLACEd and rrsets that the cleanup rule (NS/DS below the zone apex
+    not matching exclude_pattern) or a deleted zone no longer covers are DELETEd.
+    """
+    managed_suffix = f".{parent_zone}."
+    exclude_regex = re.compile(exclude_pattern)
+    diff = {"create_zones": [], "update_zones": [], "delete_zones": [], "rrsets": {}}
+
+    for name, have in sorted(current["zones"].items()):
+        if name.endswith(managed_suffix) and name not in desired["zones"]:
+            diff["delete_zones"].append(name)
+
+    for name, want in sorted(desired["zones"].items()):
+        have = current["zones"].get(name)
+        if have is None:
+            diff["create_zones"].append({"name": name, **want})
+        elif have["kind"] != want["kind"]:
+            diff["delete_zones"].append(name)
+            diff["create_zones"].append({"name": name, **want})
+        elif sorted(have["masters"]) != sorted(want["masters"]):
+            diff["update_zones"].append({"name": name, "masters": want["masters"]})
+
+    removed_zones = set(diff["delete_zones"]) - set(desired["zones"])
+    for zone, wanted in desired["rrsets"].items():
+        if zone not in current["rrsets"]:
+            logging.error("Zone %s does not exist, cannot reconcile its records.", zone)
+            continue
+        existing = current["rrsets"][zone]
+        changes = []
+
+        for key, want in sorted(wanted.items()):
+            have = existing.get(key)
+            if have is None or not _same_rrset(have, want):
+                changes.append({**want, "changetype": "REPLACE"})
+
+        apex = _fqdn(zone)
+        for key, have in sorted(existing.items()):
+            if key in wanted:
+                continue
+            name, rtype = key
+            # Only delegations below the zone are cleaned up, never its own apex NS/DS
+            stale_ns_ds = rtype in ("NS", "DS") and name != apex and not exclude_regex.search(name)
+            if stale_ns_ds or _owned_by(have, removed_zones):
+                changes.append({"name": name, "type": rtype, "changetype": "DELETE"})
+
+        if changes:
+            diff["rrsets"][zone] = changes
+
+    return diff
+
+def student_diff(added, removed, existing_zones, include_ipv4_ptr=False, parent_zone=PARENT_ZONE,
+                 ipv4_ptr_zone=IPV4_PTR_ZONE, ipv6_ptr_zone=IPV6_PTR_ZONE):
+    """The writes for just these students, in the compute_diff format, without reading any zone.
+
+    Zones and rrsets of removed students are deleted, those of added students
+    created or REPLACEd. existing_zones (e.g. a ZoneNameSet) decides between
+    creating a zone and updating its masters. An rrset that is both removed and
+    added, like the PTR of an address handed out again, is only REPLACEd.
+    """
+    gone = build_desired_state(removed, include_ipv4_ptr, parent_zone, ipv4_ptr_zone, ipv6_ptr_zone)
+    new = build_desired_state(added, include_ipv4_ptr, parent_zone, ipv4_ptr_zone, ipv6_ptr_zone)
+    diff = {"create_zones": [], "update_zones": [], "delete_zones": [], "rrsets": {}}
+
+    for name in sorted(gone["zones"]):
+        if name not in new["zones"] and name in existing_zones:
+            diff["delete_zones"].append(name)
+
+    for name, want in sorted(new["zones"].items()):
+        if name in existing_zones:
+            diff["update_zones"].append({"name": name, "masters": want["masters"]})
+        else:
+            diff["create_zones"].append({"name": name, **want})
+
+    for zone, wanted in new["rrsets"].items():
+        changes = {(name, rtype): {"name": name, "type": rtype, "changetype": "DELETE"}
+                   for name, rtype in gone["rrsets"][zone]}
+        changes.update({key: {**want, "changetype": "REPLACE"} for key, want in wanted.items()})
+        if changes:
+            diff["rrsets"][zone] = [changes[key] for key in sorted(changes)]
+
+    return diff
+
+def diff_size(diff):
+    """Number of zone-level writes in this diff (one PATCH per zone unless it is batched)."""
+    return (len(diff["create_zones"]) + len(diff["update_zones"]) +
+            len(diff["delete_zones"]) + len(diff["rrsets"]))
+
+def apply_diff(diff, max_workers=DNS_MAX_WORKERS):
+    """Push a diff from compute_diff. Returns a list of (target, error) for failed writes."""
+    errors = []
+
+    def collect(items, results, label):
+        for item, (_, error) in zip(items, results):
+            if error is not None:
+                logging.error("Failed to %s %s: %s", label, item, error)
+                errors.append((item, error))
+
+    deletes = diff["delete_zones"]
+    for zone in deletes:
+        logging.info("Deleting zone %s", zone)
+    collect(deletes, run_bounded(lambda z: api_delete(f"/zones/{z}"), deletes, max_workers,
+                                 catch=requests.RequestException), "delete zone")
+
+    creates = diff["create_zones"]
+    for zone in creates:
+        logging.info("Creating slave zone %s with masters %s", zone['name'], ', '.join(zone['masters']))
+    create = lambda z: api_post("/zones", {"name": z["name"], "kind": z["kind"],
+                                           "masters": z["masters"], "nameservers": []})
+    collect([z["name"] for z in creates], run_bounded(create, creates, max_workers,
+                                                      catch=requests.RequestException), "create zone")
+
+    updates = diff["update_zones"]
+    for zone in updates:
+        logging.info("Updating masters of zone %s → %s", zone['name'], ', '.join(zone['masters']))
+    update = lambda z: api_put(f"/zones/{z['name']}", {"masters": z["masters"]})
+    collect([z["name"] for z in updates], run_bounded(update, updates, max_workers,
+                                                      catch=requests.RequestException), "update zone")
+
+    for zone, changes in diff["rrsets"].items():
+        for change in changes:
+            logging.debug("%s %s %s in zone %s", change['changetype'], change['type'], change['name'], zone)
+        errors.extend(patch_rrsets(zone, changes))
+
+    return errors
+
+def reconcile_dns(students=None, include_ipv4_ptr=False, dry_run=False, max_workers=DNS_MAX_WORKERS,
+                  parent_zone=PARENT_ZONE, ipv4_ptr_zone=IPV4_PTR_ZONE, ipv6_ptr_zone=IPV6_PTR_ZONE,
+                  exclude_pattern=EXCLUDE_PATTERN):
+    """Bring PowerDNS in line with processed_Emails.json, writing only what changed.
+
+    Returns the applied diff, and raises RuntimeError if any of its writes failed.
+    """
+    if students is None:
+        students = load_students()
+        if students is None:
+            return None
+
+    desired = build_desired_state(students, include_ipv4_ptr, parent_zone, ipv4_ptr_zone, ipv6_ptr_zone)
+    current = fetch_current_state(list(desired["rrsets"]))
+    diff = compute_diff(desired, current, exclude_pattern, parent_zone)
+
+    logging.info(
+        "Reconcile plan for %s: %s zones to create, %s to update, %s to delete, %s rrset changes in %s zones",
+        parent_zone, len(diff['create_zones']), len(diff['update_zones']), len(diff['delete_zones']),
+        sum(len(c) for c in diff['rrsets'].values()), len(diff['rrsets'])
+    )
+    if diff_size(diff) == 0:
+        logging.info("DNS already matches the desired state, nothing to do.")
+    elif not dry_run:
+        errors = apply_diff(diff, max_workers=max_workers)
+        if errors:
+            target, error = errors[0]
+            raise RuntimeError(f"Reconcile of {parent_zone}: {len(errors)} writes failed, first {target}: {error}")
+
+    logging.info("-" * 60)
+    return diff
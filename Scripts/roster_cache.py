@@ -0,0 +1,59 @@
+import json
+import os
+import threading
+from atomic_file import write_json_atomic
+
+class RosterCache:
+    """On-disk cache of Blackboard user summaries keyed by userId.
+
+    Every entry stores the `modified` timestamp it was fetched with. A lookup only
+    hits when the caller passes the same timestamp, so users whose record changed
+    in Blackboard are fetched again. Entries without a timestamp never hit.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f).get("users", {})
+            except (OSError, ValueError) as e:
+                print(f"Roster cache {path} onleesbaar, wordt opnieuw opgebouwd ({e})")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id, modified):
+        """Cached user summary if it was stored with the same modified stamp, else None."""
+        if not modified:
+            return None
+        entry = self._entries.get(user_id)
+        if entry and entry.get("modified") == modified:
+            return entry["user"]
+        return None
+
+    def put(self, user_id, modified, user):
+        entry = {"modified": modified, "user": user}
+        with self._lock:
+            if self._entries.get(user_id) != entry:
+                self._entries[user_id] = entry
+                self._dirty = True
+
+    def prune(self, keep_ids):
+        """Drop users that are no longer in the course."""
+        keep_ids = set(keep_ids)
+        with self._lock:
+            for user_id in [u for u in self._entries if u not in keep_ids]:
+                del self._entries[user_id]
+                self._dirty = True
+
+    def save(self):
+        """Write the cache atomically, if anything changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            write_json_atomic(self.path, {"users": self._entries}, ensure_ascii=False)
+            self._dirty = False
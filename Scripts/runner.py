@@ -0,0 +1,127 @@
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from concurrency import run_bounded
+from config import RUNNER_CONFIG, RUNNER_MAX_COURSES, SCRAPER_MAX_WORKERS, SCRAPER_RATE_LIMIT
+from metrics import export_metrics
+from log_setup import setup_logging
+from create_dns import PARENT_ZONE, EXCLUDE_PATTERN, STUDENTS_FILE
+from ip_allocator import parse_pools
+from process_students import process_emails
+from reconcile_dns import reconcile_dns, diff_size
+from student_scraper import get_authenticated_session, fetch_student_data, RateLimiter
+
+REQUIRED_KEYS = ("course_id", "parent_zone", "address_pools", "ipv4_ptr_zone", "ipv6_ptr_zone")
+
+def _course_defaults(course):
+    """Fill in optional keys. The default course keeps the existing file names and cleanup pattern."""
+    name = course.setdefault("name", course["course_id"])
+    is_default_zone = course["parent_zone"] == PARENT_ZONE
+    course.setdefault("output_file", STUDENTS_FILE if is_default_zone else f"Output/processed_{name}.json")
+    course.setdefault("roster_cache", f"Output/roster_cache_{name}.json")
+    course.setdefault("exclude_emails", [])
+    course.setdefault("include_ipv4_ptr", False)
+    course.setdefault(
+        "exclude_pattern",
+        EXCLUDE_PATTERN if is_default_zone else rf"(.*-.*)\.{re.escape(course['parent_zone'])}"
+    )
+    return course
+
+def load_courses(path=RUNNER_CONFIG):
+    """Read the course -> parent zone -> subnet mappings from a JSON config file.
+
+    Every course needs its own parent zone, not nested in another course's:
+    reconcile deletes unknown zones under a parent zone, so two courses sharing
+    one would remove each other's zones. Address pools may not overlap either,
+    or two courses would hand out the same addresses.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        courses = json.load(f)["courses"]
+
+    seen = []
+    for course in courses:
+        missing = [key for key in REQUIRED_KEYS if key not in course]
+        if missing:
+            raise ValueError(f"Course {course.get('name', course.get('course_id'))} is missing {', '.join(missing)}")
+        zone = course["parent_zone"].rstrip('.').lower()
+        pools = parse_pools(course["address_pools"])
+        for other_zone, other_pools in seen:
+            if zone == other_zone or zone.endswith("." + other_zone) or other_zone.endswith("." + zone):
+                raise ValueError(f"Parent zone {course['parent_zone']} overlaps parent zone {other_zone} of another course")
+            for pool in pools:
+                for other in other_pools:
+                    if pool.ipv4_network.overlaps(other.ipv4_network) or pool.ipv6_network.overlaps(other.ipv6_network):
+                        raise ValueError(f"Address pool {pool.ipv4_network}={pool.ipv6_network} of {zone} overlaps "
+                                         f"{other.ipv4_network}={other.ipv6_network} of {other_zone}")
+        seen.append((zone, pools))
+        _course_defaults(course)
+    return courses
+
+def run_course(course, session, limiter, dry_run=False):
+    """Scrape, allocate and reconcile DNS for one course. Returns a summary dict."""
+    start = time.perf_counter()
+    logging.info("Course %s: fetching roster of %s", course['name'], course['course_id'])
+
+    data = fetch_student_data(course["course_id"], cache_file=course["roster_cache"], session=session, limiter=limiter)
+    if data is None:
+        raise RuntimeError(f"Could not fetch the roster of course {course['course_id']}")
+
+    exclude = set(course["exclude_emails"])
+    emails = [s["email"] for s in data["students"] if s["email"] and s["email"] not in exclude]
+    students = process_emails(emails, course["output_file"],
+                              parent_zone=course["parent_zone"], address_pools=course["address_pools"])
+
+    diff = reconcile_dns(
+        students,
+        include_ipv4_ptr=course["include_ipv4_ptr"],
+        dry_run=dry_run,
+        parent_zone=course["parent_zone"],
+        ipv4_ptr_zone=course["ipv4_ptr_zone"],
+        ipv6_ptr_zone=course["ipv6_ptr_zone"],
+        exclude_pattern=course["exclude_pattern"]
+    )
+    return {
+        "course": course["name"],
+        "students": len(students),
+        "writes": diff_size(diff),
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+
+def run_courses(courses, max_courses=RUNNER_MAX_COURSES, dry_run=False):
+    """Run independent courses concurrently over one Blackboard session and the shared PowerDNS client."""
+    if not courses:
+        return []
+
+    workers = min(max_courses, len(courses))
+    session = get_authenticated_session(courses[0]["course_id"], pool_size=SCRAPER_MAX_WORKERS * workers)
+    if session is None:
+        raise RuntimeError("Blackboard login failed")
+    limiter = RateLimiter(SCRAPER_RATE_LIMIT)
+
+    results = run_bounded(lambda course: run_course(course, session, limiter, dry_run), courses, workers)
+
+    summaries = []
+    for course, (summary, error) in zip(courses, results):
+        if error is not None:
+            logging.error("Course %s failed: %s", course['name'], error)
+            summaries.append({"course": course["name"], "error": str(error)})
+        else:
+            logging.info("Course %s: %s students, %s DNS writes in %s s",
+                         summary['course'], summary['students'], summary['writes'], summary['seconds'])
+            summaries.append(summary)
+    return summaries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provision DNS for several courses in one run.")
+    parser.add_argument("config", nargs="?", default=RUNNER_CONFIG, help="JSON file with a \"courses\" list")
+    parser.add_argument("--dry-run", action="store_true", help="compute the DNS changes without applying them")
+    args = parser.parse_args()
+    setup_logging()
+
+    summaries = run_courses(load_courses(args.config), dry_run=args.dry_run)
+    export_metrics()
+    print(json.dumps(summaries, indent=2))
+    sys.exit(1 if any("error" in s for s in summaries) else 0)
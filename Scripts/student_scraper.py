@@ -1,17 +1,50 @@
 # student_scraper.py
 
 import json
+import os
 import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from atomic_file import write_json_atomic
+from concurrency import run_bounded
+from config import SCRAPER_MAX_WORKERS, SCRAPER_RATE_LIMIT, ROSTER_CACHE_FILE, COOKIE_FILE, COURSE_ID
+from roster_cache import RosterCache
 
-def fetch_student_data():
-    # 1. Start the browser and authenticate
+BASE_URL = "https://ultra.edu.kuleuven.cloud"
+API_URL = f"{BASE_URL}/learn/api/public/v1"
+COURSE_ROLES = ("Instructor", "Student")
+
+# Only request the fields summarize_user and the roster cache need
+USER_FIELDS = "id,userName,modified,contact.email,name.given,name.family"
+MEMBERSHIP_FIELDS = "userId,courseRoleId,modified," + ",".join(f"user.{f}" for f in USER_FIELDS.split(","))
+
+class RateLimiter:
+    """Spaces calls to wait() at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def login_with_browser():
+    """Log in interactively via Chrome and return the session cookies, or None."""
     driver = webdriver.Chrome()
-    driver.get("https://ultra.edu.kuleuven.cloud/")
+    driver.get(f"{BASE_URL}/")
 
     try:
         WebDriverWait(driver, 15).until(
@@ -33,46 +66,189 @@ def fetch_student_data():
         driver.quit()
         return None
 
-    # 2. Get cookies
     cookies = driver.get_cookies()
     driver.quit()
+    return cookies
 
-    # 3. Use requests session with cookies
+def build_session(cookies, pool_size=SCRAPER_MAX_WORKERS):
+    """requests session carrying the browser cookies, with a pool sized for the workers."""
     session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
     for cookie in cookies:
         session.cookies.set(cookie['name'], cookie['value'])
+    return session
 
-    # 4. Get course users
-    course_users_url = "https://ultra.edu.kuleuven.cloud/learn/api/public/v1/courses/_86740_1/users"
-    response = session.get(course_users_url)
-    if response.status_code != 200:
-        print("Kon gebruikerslijst niet ophalen.")
+def load_cookies(path):
+    """Cookies saved by save_cookies, minus the ones that have expired. None if there are none."""
+    if not path or not os.path.exists(path):
         return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cookies = json.load(f)
+    except (OSError, ValueError):
+        return None
+    now = time.time()
+    cookies = [c for c in cookies if not c.get("expiry") or c["expiry"] > now]
+    return cookies or None
 
-    users_data = response.json()
-    student_ids = [
-        user["userId"]
-        for user in users_data.get("results", [])
-        if user.get("courseRoleId") == "Instructor" or user.get("courseRoleId") == "Student"
-    ]
+def save_cookies(path, cookies):
+    """Store the session cookies readable by the current user only."""
+    write_json_atomic(path, cookies, mode=0o600)
 
-    print(f"{len(student_ids)} studenten gevonden.")
+def session_is_valid(session, course_id=COURSE_ID):
+    """Cheap probe: can this session read one membership of the course?"""
+    try:
+        response = session.get(
+            f"{API_URL}/courses/{course_id}/users",
+            params={"limit": 1, "fields": "userId"},
+            allow_redirects=False,
+            timeout=15
+        )
+    except requests.RequestException:
+        return False
+    return response.status_code == 200
+
+def get_authenticated_session(course_id=COURSE_ID, pool_size=SCRAPER_MAX_WORKERS, cookie_file=COOKIE_FILE):
+    """Session with valid Blackboard cookies, reusing stored ones and only logging in via the browser when needed."""
+    cookies = load_cookies(cookie_file)
+    if cookies:
+        session = build_session(cookies, pool_size=pool_size)
+        if session_is_valid(session, course_id):
+            print("Bewaarde sessie is nog geldig, browser login overgeslagen.")
+            return session
+        print("Bewaarde sessie is verlopen.")
+
+    cookies = login_with_browser()
+    if cookies is None:
+        return None
+    if cookie_file:
+        save_cookies(cookie_file, cookies)
+    return build_session(cookies, pool_size=pool_size)
+
+def fetch_course_memberships(session, course_id=COURSE_ID, limiter=None, expand_user=True):
+    """All memberships of a course, following the paging.nextPage cursor. None on failure.
+
+    With expand_user the user record comes back inline (projected to USER_FIELDS),
+    so no per-user requests are needed.
+    """
+    memberships = []
+    url = f"{API_URL}/courses/{course_id}/users"
+    if expand_user:
+        params = {"expand": "user", "fields": MEMBERSHIP_FIELDS}
+    else:
+        params = {"fields": "userId,courseRoleId,modified"}
+    while url:
+        if limiter:
+            limiter.wait()
+        # nextPage already carries the query string of the first request
+        response = session.get(url, params=params)
+        params = None
+        if response.status_code != 200:
+            print(f"Kon gebruikerslijst niet ophalen (status {response.status_code}).")
+            return None
+
+        page = response.json()
+        memberships.extend(page.get("results", []))
+        next_page = page.get("paging", {}).get("nextPage")
+        url = f"{BASE_URL}{next_page}" if next_page else None
+    return memberships
+
+def fetch_user_details(session, user_ids, max_workers=SCRAPER_MAX_WORKERS, limiter=None):
+    """Fetch /users/{id} for every id concurrently. Returns {user_id: user} for the ones that succeeded."""
+    def fetch(user_id):
+        if limiter:
+            limiter.wait()
+        return session.get(f"{API_URL}/users/{user_id}", params={"fields": USER_FIELDS})
 
-    # 5. Get detailed user info
-    filtered_student_info = []
-    for user_id in student_ids:
-        user_url = f"https://ultra.edu.kuleuven.cloud/learn/api/public/v1/users/{user_id}"
-        user_resp = session.get(user_url)
-        if user_resp.status_code == 200:
-            data = user_resp.json()
-            filtered_student_info.append({
-                "userName": data.get("userName"),
-                "email": data.get("contact", {}).get("email", ""),
-                "givenName": data.get("name", {}).get("given", ""),
-                "familyName": data.get("name", {}).get("family", "")
-            })
+    users = {}
+    results = run_bounded(fetch, user_ids, max_workers, catch=requests.RequestException)
+    for user_id, (user_resp, error) in zip(user_ids, results):
+        if error is not None:
+            print(f"Kon student {user_id} niet ophalen ({error})")
+        elif user_resp.status_code == 200:
+            users[user_id] = user_resp.json()
         else:
             print(f"Kon student {user_id} niet ophalen (status {user_resp.status_code})")
+    return users
+
+def membership_modified(membership):
+    """Change stamp of a membership's user, or None without expand=user.
+
+    The membership's own modified does not change when the user's details do,
+    so it is never used as a cache key.
+    """
+    return (membership.get("user") or {}).get("modified")
+
+def summarize_user(data):
+    return {
+        "userName": data.get("userName"),
+        "email": data.get("contact", {}).get("email", ""),
+        "givenName": data.get("name", {}).get("given", ""),
+        "familyName": data.get("name", {}).get("family", "")
+    }
+
+def fetch_student_data(course_id=COURSE_ID, max_workers=SCRAPER_MAX_WORKERS, rate_limit=SCRAPER_RATE_LIMIT,
+                       cache_file=ROSTER_CACHE_FILE, cookie_file=COOKIE_FILE, session=None, limiter=None):
+    """Roster of a course as {"students": [...]}, or None on failure.
+
+    Pass session (and limiter) to share one authenticated session and request
+    budget between several courses.
+    """
+    # 1-2. Reuse the stored session or authenticate in the browser
+    if session is None:
+        session = get_authenticated_session(course_id, pool_size=max_workers, cookie_file=cookie_file)
+        if session is None:
+            return None
+
+    limiter = limiter or RateLimiter(rate_limit)
+
+    # 3. Get course users (all pages)
+    memberships = fetch_course_memberships(session, course_id, limiter)
+    if memberships is None:
+        return None
+
+    members = {
+        user["userId"]: user
+        for user in memberships
+        if user.get("courseRoleId") in COURSE_ROLES
+    }
+    stamps = {user_id: membership_modified(member) for user_id, member in members.items()}
+    student_ids = list(members)
+
+    print(f"{len(student_ids)} studenten gevonden.")
+
+    # 4. Get detailed user info: inline from expand=user, else from the cache, else per user
+    cache = RosterCache(cache_file) if cache_file else None
+    summaries = {}
+    for user_id, member in members.items():
+        inline = member.get("user")
+        if inline and inline.get("userName"):
+            summaries[user_id] = summarize_user(inline)
+            if cache is not None and stamps[user_id]:
+                cache.put(user_id, stamps[user_id], summaries[user_id])
+        elif cache is not None:
+            cached = cache.get(user_id, stamps[user_id])
+            if cached is not None:
+                summaries[user_id] = cached
+
+    stale_ids = [user_id for user_id in student_ids if user_id not in summaries]
+    if cache is not None:
+        print(f"{len(summaries)} studenten inline of uit cache, {len(stale_ids)} op te halen.")
+
+    users = fetch_user_details(session, stale_ids, max_workers, limiter)
+    for user_id, data in users.items():
+        summaries[user_id] = summarize_user(data)
+        # Keyed on the user's own stamp, the one a later expand=user listing reports
+        modified = stamps[user_id] or data.get("modified")
+        if cache is not None and modified:
+            cache.put(user_id, modified, summaries[user_id])
+
+    if cache is not None:
+        cache.prune(student_ids)
+        cache.save()
+
+    filtered_student_info = [summaries[user_id] for user_id in student_ids if user_id in summaries]
 
     return {"students": filtered_student_info}
 
@@ -0,0 +1,109 @@
+import json
+import os
+import sqlite3
+import threading
+from allocation_journal import AllocationJournal
+
+FIELDS = ("original_email", "hostname", "dns_zone", "ipv4", "ipv6")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    original_email TEXT NOT NULL,
+    hostname TEXT NOT NULL,
+    dns_zone TEXT NOT NULL,
+    ipv4 TEXT NOT NULL,
+    ipv6 TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS students_email ON students (original_email);
+CREATE UNIQUE INDEX IF NOT EXISTS students_hostname ON students (hostname);
+CREATE UNIQUE INDEX IF NOT EXISTS students_ipv4 ON students (ipv4);
+CREATE UNIQUE INDEX IF NOT EXISTS students_ipv6 ON students (ipv6);
+"""
+
+class StudentStore:
+    """Processed students and their addresses in an indexed SQLite database.
+
+    Rows are returned as dicts in the processed_Emails.json format, in insertion
+    order. Every write runs in a single transaction, so a failed insert (e.g. a
+    duplicate address hitting a unique index) leaves the store unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _entry(row):
+        return {field: row[field] for field in FIELDS}
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    def all(self):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(FIELDS)} FROM students ORDER BY id").fetchall()
+        return [self._entry(row) for row in rows]
+
+    def get_by_email(self, email):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM students WHERE original_email = ?", (email,)
+            ).fetchone()
+        return self._entry(row) if row else None
+
+    def has_email(self, email):
+        return self.get_by_email(email) is not None
+
+    def ipv4_addresses(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT ipv4 FROM students")]
+
+    def add_many(self, entries):
+        """Insert all entries in one transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO students ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                [tuple(entry[field] for field in FIELDS) for entry in entries]
+            )
+
+    def remove_emails(self, emails):
+        """Delete the given students in one transaction and return their entries."""
+        emails = list(emails)
+        removed = [entry for entry in (self.get_by_email(email) for email in emails) if entry]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM students WHERE original_email = ?", [(e,) for e in emails])
+        return removed
+
+    def import_json(self, path):
+        """Add the entries of a processed_Emails.json file (and its journal) not in the store yet. Returns how many."""
+        entries = AllocationJournal(path).load()
+        new_entries = [entry for entry in entries if not self.has_email(entry["original_email"])]
+        self.add_many(new_entries)
+        return len(new_entries)
+
+    def export_json(self, path):
+        """Write the store in the processed_Emails.json format."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.all(), f, indent=4)
+
+def open_store(path, json_path=None):
+    """Open the store, seeding an empty one from an existing processed_Emails.json."""
+    store = StudentStore(path)
+    if json_path and store.count() == 0 and os.path.exists(json_path):
+        store.import_json(json_path)
+    return store
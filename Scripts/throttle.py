@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from config import (
+    API_RATE_ZONE_LIST, API_RATE_ZONE_READ, API_RATE_ZONE_WRITE,
+    API_CONCURRENCY_ZONE_LIST, API_CONCURRENCY_ZONE_READ, API_CONCURRENCY_ZONE_WRITE,
+    API_MIN_CONCURRENCY, API_LATENCY_FACTOR
+)
+
+def endpoint_class(method, path, params=None):
+    """zone_list for GET /zones, zone_read for other GETs, zone_write for everything else.
+
+    A /zones listing filtered to one zone (?zone=) is as cheap as a read and counts as one.
+    """
+    if method in ("GET", "HEAD"):
+        if path.split("?", 1)[0].rstrip("/") == "/zones" and not (params or {}).get("zone"):
+            return "zone_list"
+        return "zone_read"
+    return "zone_write"
+
+class TokenBucket:
+    """Allows rate calls per second on average with bursts of up to burst calls (rate 0 = unlimited)."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Take the token now, possibly going negative; the debt is the time to wait
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+
+class AimdLimiter:
+    """Concurrency limit that grows by one per round of healthy calls and halves on congestion.
+
+    A call is congestion when it failed with 429/5xx or a connection error, needed
+    retries, or took more than latency_factor times the usual latency of this class
+    (0 disables the latency signal). The limit is decreased at most once per
+    typical call duration, so one burst of failures does not collapse it to the minimum.
+    """
+
+    def __init__(self, max_limit, min_limit=1, backoff=0.5, latency_factor=3.0, name=""):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self.limit = float(self.max_limit)
+        self.inflight = 0
+        self._baseline = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, seconds, congested=False):
+        with self._cond:
+            self.inflight -= 1
+            if not congested and self.latency_factor and self._baseline:
+                congested = seconds > self._baseline * self.latency_factor
+
+            if congested:
+                now = time.monotonic()
+                if now - self._last_decrease >= (self._baseline or seconds):
+                    old = int(self.limit)
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    if int(self.limit) != old:
+                        logging.debug("Throttling %s: concurrency %s → %s", self.name, old, int(self.limit))
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self._baseline = seconds if self._baseline is None else 0.9 * self._baseline + 0.1 * seconds
+            self._cond.notify_all()
+
+class EndpointThrottle:
+    """Token bucket plus AIMD concurrency limit for one endpoint class."""
+
+    def __init__(self, name, rate, max_concurrency, min_concurrency=API_MIN_CONCURRENCY,
+                 latency_factor=API_LATENCY_FACTOR):
+        self.name = name
+        self.bucket = TokenBucket(rate)
+        self.limiter = AimdLimiter(max_concurrency, min_concurrency, latency_factor=latency_factor, name=name)
+
+    @contextmanager
+    def slot(self):
+        """Wait for a concurrency slot and a token. Yields a dict; set its "congested" key before leaving."""
+        self.limiter.acquire()
+        outcome = {"congested": False}
+        start = time.perf_counter()
+        try:
+            self.bucket.acquire()
+            start = time.perf_counter()
+            yield outcome
+        finally:
+            self.limiter.release(time.perf_counter() - start, outcome["congested"])
+
+def build_throttles():
+    """One EndpointThrottle per endpoint class from the API_RATE_* / API_CONCURRENCY_* settings."""
+    return {
+        "zone_list": EndpointThrottle("zone_list", API_RATE_ZONE_LIST, API_CONCURRENCY_ZONE_LIST),
+        "zone_read": EndpointThrottle("zone_read", API_RATE_ZONE_READ, API_CONCURRENCY_ZONE_READ),
+        "zone_write": EndpointThrottle("zone_write", API_RATE_ZONE_WRITE, API_CONCURRENCY_ZONE_WRITE),
+    }
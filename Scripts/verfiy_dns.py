@@ -1,143 +1,419 @@
 import re
+import sys
+import time
+import threading
+import requests
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
 from api_helper import api_get
+from concurrency import run_bounded
+from config import DNS_MAX_WORKERS, DNS_PROBE_SERVER, DNS_PROBE_PORT, DNS_PROBE_MASTERS
+from dns_probe import probe_zones
+from metrics import export_metrics
+from log_setup import setup_logging
+from create_dns import (
+    PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE, NS_TARGETS, EXCLUDE_PATTERN,
+    load_students, ipv4_to_arpa, ipv6_to_arpa
+)
 import json
 
-def verify_zone_exists(zone_name):
+class ZoneSnapshotCache:
+    """Zones fetched from PowerDNS at most once per verification run.
+
+    Each zone's rrsets are indexed by (name, type). Lookups are thread-safe and
+    concurrent requests for the same zone share a single fetch. Call invalidate()
+    after changing a zone to force a re-download.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._zones = {}
+        self._indexes = {}
+        self._listing = None
+
+    @staticmethod
+    def _key(zone_name):
+        return zone_name.rstrip('.')
+
+    def _fetch_lock(self, key):
+        with self._lock:
+            return self._fetch_locks.setdefault(key, threading.Lock())
+
+    def listing(self):
+        """The /zones listing (zone metadata without rrsets)."""
+        with self._fetch_lock("/zones"):
+            if self._listing is None:
+                self._listing = api_get("/zones")
+            return self._listing
+
+    def zone(self, zone_name):
+        """The full zone, or None if PowerDNS does not know it."""
+        key = self._key(zone_name)
+        with self._fetch_lock(key):
+            if key not in self._zones:
+                try:
+                    # Always from the server, never the zone cache: this is what gets verified
+                    zone = api_get(f"/zones/{key}")
+                except requests.HTTPError as e:
+                    if e.response is None or e.response.status_code != 404:
+                        raise
+                    zone = None
+                self._zones[key] = zone
+                self._indexes[key] = {
+                    (rr["name"], rr["type"]): rr for rr in (zone or {}).get("rrsets", [])
+                }
+            return self._zones[key]
+
+    def rrset(self, zone_name, name, type_):
+        """The rrset for (name, type_) in zone_name, or None."""
+        self.zone(zone_name)
+        fqdn = name if name.endswith('.') else f"{name}."
+        return self._indexes.get(self._key(zone_name), {}).get((fqdn, type_))
+
+    def invalidate(self, zone_name=None):
+        """Forget one zone (and the listing), or everything when zone_name is None."""
+        with self._lock:
+            self._listing = None
+            if zone_name is None:
+                self._zones.clear()
+                self._indexes.clear()
+            else:
+                key = self._key(zone_name)
+                self._zones.pop(key, None)
+                self._indexes.pop(key, None)
+
+@dataclass
+class CheckResult:
+    check: str
+    target: str
+    status: str  # "ok", "fail" or "error"
+    expected: object = None
+    found: object = None
+    message: str = ""
+    duration_ms: float = 0.0
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+    def line(self):
+        return f"[{'OK' if self.ok else 'FAIL'}] {self.message}"
+
+@dataclass
+class VerificationReport:
+    started_at: str
+    duration_ms: float = 0.0
+    results: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results)
+
+    def summary(self):
+        counts = {"ok": 0, "fail": 0, "error": 0}
+        for r in self.results:
+            counts[r.status] += 1
+        return counts
+
+    def failures(self):
+        return [r for r in self.results if not r.ok]
+
+    def to_dict(self):
+        return {
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "summary": self.summary(),
+            "checks": [asdict(r) for r in self.results]
+        }
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print(self):
+        for r in self.results:
+            print(r.line())
+            if not r.ok and r.expected is not None:
+                print(f"Expected: {r.expected}")
+                print(f"Found:    {r.found}")
+        s = self.summary()
+        print(f"{s['ok']} checks passed, {s['fail']} failed, {s['error']} errors in {self.duration_ms:.0f} ms")
+
+def _timed(check, target, func):
+    """Run func() -> CheckResult, timing it and turning exceptions into an error result."""
+    start = time.perf_counter()
     try:
-        zone = api_get(f"/zones/{zone_name}")
-        print(f"[OK] Zone exists: {zone_name}")
-        return zone
-    except:
-        print(f"[FAIL] Zone missing: {zone_name}")
-        return None
-
-def verify_no_sasm_zones():
-    print("Verifying no stray .sasm.uclllabs.be zones remain...")
-    zones = api_get("/zones")
-    errors = 0
-    for zone in zones:
-        name = zone["name"]
-        if name.endswith(".sasm.uclllabs.be") and not re.search(r"(.*-.*|pieter|rudi)\.sasm\.uclllabs\.be.", name):
-            print(f"[FAIL] Unexpected .sasm zone still exists: {name}")
-            errors += 1
-    if errors == 0:
-        print("[OK] No unwanted .sasm.uclllabs.be zones found.")
-
-def verify_ns_records(zone_name, expected_ns):
-    zone = verify_zone_exists(zone_name)
-    if not zone:
-        return
-
-    fqdn = zone_name if zone_name.endswith('.') else f"{zone_name}."
-
-    ns_records = [
-        rr for rr in zone.get("rrsets", [])
-        if rr["type"] == "NS" and rr["name"] == fqdn
-    ]
+        result = func()
+    except Exception as e:
+        result = CheckResult(check, target, "error", message=f"{check} check for {target} raised {e!r}")
+    result.duration_ms = (time.perf_counter() - start) * 1000
+    return result
 
-    if not ns_records:
-        print(f"[FAIL] No NS records found in {zone_name}")
-        return
+def _fqdn(name):
+    return name if name.endswith('.') else f"{name}."
+
+def check_zone_exists(zone_name, cache):
+    found = cache.zone(zone_name) is not None
+    if found:
+        return CheckResult("zone_exists", zone_name, "ok", True, True, f"Zone exists: {zone_name}")
+    return CheckResult("zone_exists", zone_name, "fail", True, False, f"Zone missing: {zone_name}")
+
+def check_no_stray_zones(cache, parent_zone=PARENT_ZONE, exclude_pattern=EXCLUDE_PATTERN):
+    suffix = f".{parent_zone}"
+    exclude_regex = re.compile(exclude_pattern)
+    stray = sorted(
+        z["name"] for z in cache.listing()
+        if z["name"].rstrip('.').endswith(suffix) and not exclude_regex.search(z["name"])
+    )
+    if stray:
+        return CheckResult("no_stray_zones", parent_zone, "fail", [], stray,
+                           f"Unexpected {suffix} zones still exist: {', '.join(stray)}")
+    return CheckResult("no_stray_zones", parent_zone, "ok", [], [], f"No unwanted {suffix} zones found.")
+
+def check_ns_records(zone_name, name, expected_ns, cache):
+    if cache.zone(zone_name) is None:
+        return CheckResult("ns", name, "fail", None, None, f"Zone missing: {zone_name}")
+
+    expected = sorted(ns.rstrip('.') for ns in expected_ns)
+    rr = cache.rrset(zone_name, name, "NS")
+    if not rr:
+        return CheckResult("ns", name, "fail", expected, [], f"No NS records found for {name} in {zone_name}")
 
     # Strip trailing dots from actual records before comparison
-    actual_ns = sorted([rec["content"].rstrip('.') for rec in ns_records[0]["records"]])
-    expected_ns_normalized = sorted([ns.rstrip('.') for ns in expected_ns])
+    found = sorted(rec["content"].rstrip('.') for rec in rr["records"])
+    if found == expected:
+        return CheckResult("ns", name, "ok", expected, found, f"NS records correct for {name} in {zone_name}")
+    return CheckResult("ns", name, "fail", expected, found, f"NS records mismatch for {name} in {zone_name}")
+
+def check_apex_ns(zone_name, cache):
+    """The NS rrset at the apex of a managed zone must never be cleaned up."""
+    fqdn = _fqdn(zone_name)
+    if cache.zone(zone_name) is None:
+        return CheckResult("apex_ns", fqdn, "fail", None, None, f"Zone missing: {zone_name}")
+    rr = cache.rrset(zone_name, fqdn, "NS")
+    found = sorted(rec["content"] for rec in (rr or {}).get("records", []))
+    if found:
+        return CheckResult("apex_ns", fqdn, "ok", "NS", found, f"Apex NS records present for {fqdn}")
+    return CheckResult("apex_ns", fqdn, "fail", "NS", [], f"Apex NS records missing for {fqdn}")
 
-    if actual_ns == expected_ns_normalized:
-        print(f"[OK] NS records correct in {zone_name}")
-    else:
-        print(f"[FAIL] NS records mismatch in {zone_name}")
-        print(f"Expected: {expected_ns_normalized}")
-        print(f"Found:    {actual_ns}")
+def check_glue_record(zone_name, name, type_, expected, cache):
+    check = f"glue_{type_.lower()}"
+    if cache.zone(zone_name) is None:
+        return CheckResult(check, name, "fail", None, None, f"Zone missing: {zone_name}")
 
+    rr = cache.rrset(zone_name, name, type_)
+    found = sorted(rec["content"] for rec in rr["records"]) if rr else []
+    expected = sorted(expected)
+    if found == expected:
+        return CheckResult(check, name, "ok", expected, found, f"{type_} record for {name} is correct.")
+    return CheckResult(check, name, "fail", expected, found,
+                       f"{type_} record mismatch for {name}. Expected {expected}, got {found}")
 
-def verify_glue_records(name, expected_a, expected_aaaa, zone_name):
-    zone = verify_zone_exists(zone_name)
-    if not zone:
-        return
+def check_slave_zone(zone_name, cache):
+    fqdn = _fqdn(zone_name)
+    exists = fqdn in {z["name"] for z in cache.listing()}
+    if exists:
+        return CheckResult("slave_zone", fqdn, "ok", True, True, f"Slave zone exists: {fqdn}")
+    return CheckResult("slave_zone", fqdn, "fail", True, False, f"Missing slave zone: {fqdn}")
 
-    fqdn = name if name.endswith('.') else f"{name}."
+def check_ptr_record(zone_name, ptr_name, expected_target, cache):
+    if cache.zone(zone_name) is None:
+        return CheckResult("ptr", ptr_name, "fail", None, None, f"Zone missing: {zone_name}")
 
-    def get_record(type_):
-        for rr in zone.get("rrsets", []):
-            if rr["name"] == fqdn and rr["type"] == type_:
-                return sorted([rec["content"] for rec in rr["records"]])
-        return []
+    expected = _fqdn(expected_target)
+    rr = cache.rrset(zone_name, ptr_name, "PTR")
+    if not rr:
+        return CheckResult("ptr", ptr_name, "fail", expected, [], f"PTR record not found: {ptr_name}")
 
-    actual_a = get_record("A")
-    actual_aaaa = get_record("AAAA")
+    found = [rec["content"] for rec in rr["records"]]
+    if any(_fqdn(c) == expected for c in found):
+        return CheckResult("ptr", ptr_name, "ok", expected, found, f"PTR record correct: {ptr_name} -> {expected_target}")
+    return CheckResult("ptr", ptr_name, "fail", expected, found, f"PTR record incorrect for {ptr_name}")
 
-    if actual_a == sorted(expected_a):
-        print(f"[OK] A record for {name} is correct.")
-    else:
-        print(f"[FAIL] A record mismatch for {name}. Expected {expected_a}, got {actual_a}")
+def build_checks(students, include_ipv4_ptr=False):
+    """List (check, target, callable(cache)) for every student in processed_Emails.json."""
+    checks = [("no_stray_zones", PARENT_ZONE, lambda c: check_no_stray_zones(c))]
+    for zone in (PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE):
+        checks.append(("apex_ns", _fqdn(zone), lambda c, z=zone: check_apex_ns(z, c)))
 
-    if actual_aaaa == sorted(expected_aaaa):
-        print(f"[OK] AAAA record for {name} is correct.")
-    else:
-        print(f"[FAIL] AAAA record mismatch for {name}. Expected {expected_aaaa}, got {actual_aaaa}")
+    for student in students:
+        dns_zone = student.get("dns_zone")
+        ipv4 = student.get("ipv4")
+        ipv6 = student.get("ipv6")
+        if not dns_zone:
+            continue
 
-def verify_slave_zones_created(emails):
+        zone_fqdn = _fqdn(dns_zone)
+        ns_name = f"ns.{zone_fqdn}"
+        ptr_target = f"mx.{zone_fqdn}"
+
+        checks.append(("slave_zone", zone_fqdn, lambda c, z=zone_fqdn: check_slave_zone(z, c)))
+        checks.append(("ns", zone_fqdn, lambda c, z=zone_fqdn, ns=ns_name:
+                       check_ns_records(PARENT_ZONE, z, [*NS_TARGETS, ns], c)))
+        if ipv4:
+            checks.append(("glue_a", ns_name, lambda c, n=ns_name, ip=ipv4:
+                           check_glue_record(PARENT_ZONE, n, "A", [ip], c)))
+            if include_ipv4_ptr:
+                ptr4 = ipv4_to_arpa(ipv4)
+                checks.append(("ptr", ptr4, lambda c, p=ptr4, t=ptr_target:
+                               check_ptr_record(IPV4_PTR_ZONE, p, t, c)))
+        if ipv6:
+            checks.append(("glue_aaaa", ns_name, lambda c, n=ns_name, ip=ipv6:
+                           check_glue_record(PARENT_ZONE, n, "AAAA", [ip], c)))
+            ptr6 = ipv6_to_arpa(ipv6)
+            checks.append(("ptr", ptr6, lambda c, p=ptr6, t=ptr_target:
+                           check_ptr_record(IPV6_PTR_ZONE, p, t, c)))
+    return checks
+
+def _serial_older(serial, reference):
+    """True if serial is behind reference in RFC 1982 serial number arithmetic."""
+    return 0 < (reference - serial) % (1 << 32) < (1 << 31)
+
+def check_zone_transfer(probe):
+    zone = probe.zone
+    if probe.error:
+        return CheckResult("zone_transfer", zone, "error", "SOA", None,
+                           f"No SOA answer from {probe.server} for {zone}: {probe.error}", probe.duration_ms)
+    if probe.rcode != "NOERROR" or not probe.authoritative or probe.serial is None:
+        found = f"{probe.rcode}{'' if probe.authoritative else ', not authoritative'}, serial {probe.serial}"
+        return CheckResult("zone_transfer", zone, "fail", "authoritative SOA", found,
+                           f"Zone not transferred on {probe.server}: {zone}", probe.duration_ms)
+    return CheckResult("zone_transfer", zone, "ok", "authoritative SOA", probe.serial,
+                       f"Zone transferred on {probe.server}: {zone} (serial {probe.serial})", probe.duration_ms)
+
+def check_zone_ns(probe):
+    zone = probe.zone
+    expected = f"ns.{zone}"
+    if expected in probe.ns:
+        return CheckResult("zone_ns", zone, "ok", expected, probe.ns, f"NS served for {zone}", probe.duration_ms)
+    return CheckResult("zone_ns", zone, "fail", expected, probe.ns,
+                       f"NS of {zone} on {probe.server} does not include {expected}", probe.duration_ms)
+
+def check_zone_fresh(slave, master):
+    zone = slave.zone
+    if master.error or master.serial is None:
+        reason = master.error or master.rcode
+        return CheckResult("zone_fresh", zone, "error", None, None,
+                           f"Could not read the SOA of {zone} from master {master.server}: {reason}", master.duration_ms)
+    if _serial_older(slave.serial, master.serial):
+        return CheckResult("zone_fresh", zone, "fail", master.serial, slave.serial,
+                           f"Stale slave zone {zone}: serial {slave.serial}, master has {master.serial}",
+                           master.duration_ms)
+    return CheckResult("zone_fresh", zone, "ok", master.serial, slave.serial,
+                       f"Slave zone {zone} is up to date with master {master.server}", master.duration_ms)
+
+def run_dns_probe_checks(students, server=DNS_PROBE_SERVER, port=DNS_PROBE_PORT, check_masters=DNS_PROBE_MASTERS,
+                         master_port=None):
+    """Ask the authoritative server over DNS whether every student zone was transferred.
+
+    Queries SOA and NS for each zone (hundreds at a time, over UDP), and with
+    check_masters compares the SOA serial with the one the student's master
+    (their ipv4, on master_port or else port) serves.
+    """
+    zones = {}
+    for student in students:
+        if student.get("dns_zone"):
+            zones.setdefault(_fqdn(student["dns_zone"]), student.get("ipv4"))
+
+    targets = [((server, port), zone) for zone in zones]
+    masters = [(zone, ipv4) for zone, ipv4 in zones.items() if check_masters and ipv4]
+    targets += [((ipv4, master_port or port), zone) for zone, ipv4 in masters]
+    probes = probe_zones(targets)
+    slaves = dict(zip(zones, probes))
+    master_probes = dict(zip((zone for zone, _ in masters), probes[len(zones):]))
+
+    results = []
+    for zone, probe in slaves.items():
+        transfer = check_zone_transfer(probe)
+        results.append(transfer)
+        if not transfer.ok:
+            continue
+        results.append(check_zone_ns(probe))
+        if zone in master_probes:
+            results.append(check_zone_fresh(probe, master_probes[zone]))
+    return results
+
+def run_verification(students, cache=None, max_workers=DNS_MAX_WORKERS, include_ipv4_ptr=False,
+                     dns_server=DNS_PROBE_SERVER):
+    """Run all checks concurrently and return a VerificationReport in check order.
+
+    With dns_server the DNS-protocol checks of run_dns_probe_checks are appended.
+    """
+    cache = cache or ZoneSnapshotCache()
+    report = VerificationReport(started_at=datetime.now(timezone.utc).isoformat())
+    start = time.perf_counter()
+
+    checks = build_checks(students, include_ipv4_ptr=include_ipv4_ptr)
+    outcomes = run_bounded(lambda item: _timed(item[0], item[1], lambda: item[2](cache)), checks, max_workers)
+    report.results = [result for result, _ in outcomes]
+    if dns_server:
+        report.results.extend(run_dns_probe_checks(students, dns_server))
+
+    report.duration_ms = (time.perf_counter() - start) * 1000
+    return report
+
+def _print_result(result):
+    print(result.line())
+    return result
+
+# Single checks that print their outcome, for ad-hoc use
+
+def verify_zone_exists(zone_name, cache=None):
+    cache = cache or ZoneSnapshotCache()
+    result = _print_result(_timed("zone_exists", zone_name, lambda: check_zone_exists(zone_name, cache)))
+    return cache.zone(zone_name) if result.ok else None
+
+def verify_no_sasm_zones(cache=None):
+    cache = cache or ZoneSnapshotCache()
+    print(f"Verifying no stray .{PARENT_ZONE} zones remain...")
+    return _print_result(check_no_stray_zones(cache))
+
+def verify_ns_records(zone_name, expected_ns, cache=None, name=None):
+    cache = cache or ZoneSnapshotCache()
+    return _print_result(check_ns_records(zone_name, name or zone_name, expected_ns, cache))
+
+def verify_glue_records(name, expected_a, expected_aaaa, zone_name, cache=None):
+    cache = cache or ZoneSnapshotCache()
+    return [
+        _print_result(check_glue_record(zone_name, name, "A", expected_a, cache)),
+        _print_result(check_glue_record(zone_name, name, "AAAA", expected_aaaa, cache))
+    ]
+
+def verify_slave_zones_created(emails, cache=None):
+    cache = cache or ZoneSnapshotCache()
     expected_zones = [
-        f"{email.split('@')[0].replace('.', '-')}.sasm.uclllabs.be."
+        f"{email.split('@')[0].replace('.', '-')}.{PARENT_ZONE}."
         for email in emails
         if email and "@" in email and not email.startswith("#")
     ]
-    zones = api_get("/zones")
-    existing_zone_names = {z["name"] for z in zones}
-    for zone in expected_zones:
-        if zone in existing_zone_names:
-            print(f"[OK] Slave zone exists: {zone}")
-        else:
-            print(f"[FAIL] Missing slave zone: {zone}")
-
-def verify_ptr_record(zone_name, ptr_name, expected_target):
-    zone = verify_zone_exists(zone_name)
-    if not zone:
-        return
-
-    ptr_fqdn = ptr_name if ptr_name.endswith('.') else f"{ptr_name}."
-    expected_fqdn = expected_target if expected_target.endswith('.') else f"{expected_target}."
-
-    for rr in zone.get("rrsets", []):
-        if rr["name"] == ptr_fqdn and rr["type"] == "PTR":
-            if any(rec["content"].rstrip('.') == expected_fqdn.rstrip('.') for rec in rr["records"]):
-                print(f"[OK] PTR record correct: {ptr_name} -> {expected_target}")
-            else:
-                print(f"[FAIL] PTR record incorrect for {ptr_name}")
-                print(f"Expected: {expected_target}")
-                print(f"Found: {[rec['content'] for rec in rr['records']]}")
-            return
-
-    print(f"[FAIL] PTR record not found: {ptr_name}")
-
-def verify_dns_changes(emails):
-    verify_no_sasm_zones()
-
-    # Verify NS records and glue records in parent zone
-    verify_ns_records("sasm.uclllabs.be", [
-        "ns1.uclllabs.be",
-        "ns2.uclllabs.be",
-        "ns.slimme-rik.sasm.uclllabs.be"
-    ])
-    verify_glue_records("ns.slimme-rik.sasm.uclllabs.be",
-                        expected_a=["193.191.176.1"],
-                        expected_aaaa=["2001:6a8:2880:a020::1"],
-                        zone_name="sasm.uclllabs.be")
-
-    # Verify slimme-rik zone exists
-    verify_zone_exists("slimme-rik.sasm.uclllabs.be")
-
-    # Verify slave zones for students
-    verify_slave_zones_created(emails)
-
-    # Verify PTR record
-    verify_ptr_record(
-        "176.191.193.in-addr.arpa",
-        "1.176.191.193.in-addr.arpa",
-        "mx.slimme-rik.sasm.uclllabs.be"
-    )
+    return [_print_result(check_slave_zone(zone, cache)) for zone in expected_zones]
+
+def verify_ptr_record(zone_name, ptr_name, expected_target, cache=None):
+    cache = cache or ZoneSnapshotCache()
+    return _print_result(check_ptr_record(zone_name, ptr_name, expected_target, cache))
+
+def verify_dns_changes(emails=None, students=None, report_path=None, max_workers=DNS_MAX_WORKERS):
+    """Verify every student's zone, NS, glue and PTR records.
+
+    Students default to processed_Emails.json, optionally limited to emails.
+    Prints one line per check, optionally writes the report as JSON and returns it.
+    """
+    if students is None:
+        students = load_students() or []
+    if emails is not None:
+        wanted = set(emails)
+        students = [s for s in students if s.get("original_email") in wanted]
+
+    report = run_verification(students, max_workers=max_workers)
+    report.print()
+    if report_path:
+        report.write_json(report_path)
+    return report
 
 if __name__ == "__main__":
-    # Sample call with email list
-    verify_dns_changes()
+    setup_logging()
+    # Optional argument: path of the JSON report to write
+    report = verify_dns_changes(report_path=sys.argv[1] if len(sys.argv) > 1 else None)
+    export_metrics()
+    sys.exit(0 if report.ok else 1)
@@ -0,0 +1,326 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from atomic_file import write_json_atomic
+from config import (
+    COURSE_ID, STUDENT_DB, SCRAPER_RATE_LIMIT,
+    WATCH_INTERVAL, WATCH_DEBOUNCE, WATCH_MAX_REMOVALS, WATCH_RESYNC_INTERVAL,
+    WATCH_STATUS_FILE, WATCH_STATE_FILE, WATCH_HEALTH_PORT, WATCH_EXCLUDE_EMAILS
+)
+from metrics import export_metrics
+from log_setup import setup_logging, log_stage
+from create_dns import STUDENTS_FILE, ZoneNameSet
+from process_students import process_emails, release_emails, load_students
+from reconcile_dns import (
+    build_desired_state, fetch_current_state, compute_diff, student_diff, apply_diff, diff_size
+)
+from student_scraper import get_authenticated_session, fetch_student_data, RateLimiter
+from student_store import open_store
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def blackboard_roster(course_id=COURSE_ID, rate_limit=SCRAPER_RATE_LIMIT):
+    """A fetch_roster for Watcher: the emails of the course, or None if the scrape failed.
+
+    The Blackboard session is kept between polls and only renewed after a failure.
+    """
+    session = None
+    limiter = RateLimiter(rate_limit)
+
+    def fetch():
+        nonlocal session
+        if session is None:
+            session = get_authenticated_session(course_id)
+            if session is None:
+                return None
+        data = fetch_student_data(course_id, session=session, limiter=limiter)
+        if data is None:
+            session = None
+            return None
+        return [student["email"] for student in data["students"] if student["email"]]
+
+    return fetch
+
+class Watcher:
+    """Polls the course roster and applies added and removed students to DNS.
+
+    A change is applied once the roster has looked the same for debounce seconds,
+    so students enrolling one by one go out as one batch. Only the zones, glue and
+    PTR records of those students are written. Only students the watcher has
+    seen on the roster (remembered in state_file) are ever removed, so entries
+    added by hand or excluded stay pinned. Removing more than max_removals
+    students at once is held back, since a half-loaded roster must not delete
+    everyone. A full reconcile runs at start-up, every resync_interval seconds
+    (0 = never) and after any failed write. Progress is kept in status and
+    written to status_file after every poll.
+    """
+
+    def __init__(self, fetch_roster, interval=WATCH_INTERVAL, debounce=WATCH_DEBOUNCE,
+                 max_removals=WATCH_MAX_REMOVALS, resync_interval=WATCH_RESYNC_INTERVAL,
+                 status_file=WATCH_STATUS_FILE, state_file=WATCH_STATE_FILE, exclude_emails=WATCH_EXCLUDE_EMAILS,
+                 output_file=STUDENTS_FILE, store=None, include_ipv4_ptr=False):
+        self.fetch_roster = fetch_roster
+        self.interval = interval
+        self.debounce = debounce
+        self.max_removals = max_removals
+        self.resync_interval = resync_interval
+        self.status_file = status_file
+        self.state_file = state_file
+        self.exclude_emails = {e.strip() for e in exclude_emails.split(",") if e.strip()}
+        self.output_file = output_file
+        self.store = store
+        self.include_ipv4_ptr = include_ipv4_ptr
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pending = None
+        self._pending_since = None
+        self._pending_seen_at = None
+        self._needs_resync = True
+        self._last_resync = None
+        self._seen = self._load_seen()
+        self.status = {
+            "state": "starting",
+            "started_at": _now(),
+            "last_poll_at": None,
+            "last_poll_seconds": None,
+            "roster_size": None,
+            "processed_students": None,
+            "pinned_students": None,
+            "backlog": {"added": 0, "removed": 0, "pending_since": None, "held_removals": 0},
+            "last_apply_at": None,
+            "last_apply_seconds": None,
+            "last_apply_writes": None,
+            "last_resync_at": None,
+            "last_resync_seconds": None,
+            "polls": 0,
+            "applies": 0,
+            "consecutive_failures": 0,
+            "last_error": None
+        }
+
+    def students(self):
+        return self.store.all() if self.store is not None else load_students(self.output_file) or []
+
+    def _load_seen(self):
+        """Emails seen on the roster by earlier runs that are still processed."""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return set()
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            return set(json.load(f).get("seen_on_roster", []))
+
+    def _remember_roster(self, roster, processed):
+        # Forget students once they are released, so the file does not grow forever
+        seen = (self._seen | roster) & (processed | roster)
+        if seen != self._seen:
+            self._seen = seen
+            if self.state_file:
+                write_json_atomic(self.state_file, {"seen_on_roster": sorted(seen)}, indent=1)
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.status))
+
+    def healthy(self):
+        """False after three failed polls in a row or when no poll finished for three intervals."""
+        status = self.snapshot()
+        if status["consecutive_failures"] >= 3:
+            return False
+        last = status["last_poll_at"] or status["started_at"]
+        age = (datetime.now(timezone.utc) - datetime.fromisoformat(last)).total_seconds()
+        return age <= 3 * self.interval + self.debounce
+
+    def _update(self, **fields):
+        with self._lock:
+            self.status.update(fields)
+
+    def _write_status(self):
+        if self.status_file:
+            write_json_atomic(self.status_file, self.snapshot(), indent=2)
+
+    def poll_once(self):
+        """One poll: fetch the roster, track the backlog and apply or resync when due."""
+        self._update(state="polling")
+        start = time.perf_counter()
+        try:
+            with log_stage("watch_poll"):
+                emails = self.fetch_roster()
+            if emails is None:
+                raise RuntimeError("Could not fetch the roster")
+            self._handle_roster(set(emails) - self.exclude_emails)
+            self._update(consecutive_failures=0, last_error=None)
+        except Exception as e:
+            logging.exception("Watch poll failed")
+            with self._lock:
+                self.status["consecutive_failures"] += 1
+                self.status["last_error"] = f"{type(e).__name__}: {e}"
+        with self._lock:
+            self.status["polls"] += 1
+            self.status.update(state="idle", last_poll_at=_now(),
+                               last_poll_seconds=round(time.perf_counter() - start, 3))
+        self._write_status()
+
+    def _handle_roster(self, roster):
+        processed = {student["original_email"] for student in self.students()}
+        self._remember_roster(roster, processed)
+        added = roster - processed
+        # Entries that never were on the roster (added by hand, excluded) are pinned
+        removed = (processed & self._seen) - roster - self.exclude_emails
+        held = 0
+        if len(removed) > self.max_removals:
+            logging.error("Roster drops %s of %s students; holding the removals back (WATCH_MAX_REMOVALS=%s)",
+                          len(removed), len(processed), self.max_removals)
+            held = len(removed)
+            removed = set()
+
+        now = time.monotonic()
+        change = (frozenset(added), frozenset(removed))
+        if change != self._pending:
+            self._pending = change
+            self._pending_since = now if added or removed else None
+            self._pending_seen_at = _now() if added or removed else None
+            if added or removed:
+                logging.info("Roster change seen: %s added, %s removed; waiting %s s for it to settle",
+                             len(added), len(removed), self.debounce)
+        self._update(
+            roster_size=len(roster),
+            processed_students=len(processed),
+            pinned_students=len(processed - self._seen),
+            backlog={
+                "added": len(added),
+                "removed": len(removed),
+                "pending_since": self._pending_seen_at,
+                "held_removals": held
+            }
+        )
+
+        if self._pending_since is not None and now - self._pending_since >= self.debounce:
+            self.apply(added, removed)
+        if self._needs_resync or (self.resync_interval and now - self._last_resync >= self.resync_interval):
+            self.resync()
+
+    def apply(self, added, removed):
+        """Allocate the added students, release the removed ones and write only their DNS records."""
+        self._update(state="applying")
+        start = time.perf_counter()
+        # The allocations below are saved before DNS is written, so a failure from here on
+        # must leave a full reconcile due; it is only cleared again after a clean apply
+        resync_was_due = self._needs_resync
+        self._needs_resync = True
+        with log_stage("watch_apply"):
+            released = release_emails(removed, self.output_file, store=self.store) if removed else []
+            new_entries = []
+            if added:
+                students = process_emails(sorted(added), self.output_file, store=self.store)
+                new_entries = [student for student in students if student["original_email"] in added]
+
+            diff = student_diff(new_entries, released, ZoneNameSet.fetch(), include_ipv4_ptr=self.include_ipv4_ptr)
+            logging.info("Applying %s added and %s removed students: %s zone-level writes",
+                         len(new_entries), len(released), diff_size(diff))
+            errors = apply_diff(diff)
+
+        if errors:
+            logging.warning("%s DNS writes failed; a full reconcile follows", len(errors))
+        self._needs_resync = resync_was_due or bool(errors)
+        self._pending = None
+        self._pending_since = None
+        self._pending_seen_at = None
+        with self._lock:
+            self.status["applies"] += 1
+            self.status["backlog"].update(added=0, removed=0, pending_since=None)
+            self.status.update(last_apply_at=_now(), last_apply_writes=diff_size(diff),
+                               last_apply_seconds=round(time.perf_counter() - start, 3))
+        export_metrics()
+
+    def resync(self):
+        """Full reconcile of every processed student, repairing anything an incremental apply missed."""
+        self._update(state="resyncing")
+        start = time.perf_counter()
+        with log_stage("watch_resync"):
+            desired = build_desired_state(self.students(), include_ipv4_ptr=self.include_ipv4_ptr)
+            diff = compute_diff(desired, fetch_current_state(list(desired["rrsets"])))
+            logging.info("Full reconcile: %s zone-level writes", diff_size(diff))
+            errors = apply_diff(diff) if diff_size(diff) else []
+        # Keep retrying on later polls until a reconcile goes through cleanly
+        self._needs_resync = bool(errors)
+        self._last_resync = time.monotonic()
+        self._update(last_resync_at=_now(), last_resync_seconds=round(time.perf_counter() - start, 3))
+        export_metrics()
+
+    def _next_wait(self):
+        """Seconds until the next poll: the interval, or sooner when a pending change settles."""
+        if self._pending_since is None:
+            return self.interval
+        remaining = self._pending_since + self.debounce - time.monotonic()
+        return max(1.0, min(self.interval, remaining))
+
+    def run(self):
+        logging.info("Watching the roster every %s s (debounce %s s)", self.interval, self.debounce)
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self._next_wait())
+        self._update(state="stopped")
+        self._write_status()
+
+    def stop(self):
+        self._stop.set()
+
+def serve_health(watcher, port, host="0.0.0.0"):
+    """Serve GET /health (200 or 503) and GET /status (the status JSON) in a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/health":
+                healthy = watcher.healthy()
+                code, body = (200 if healthy else 503), {"healthy": healthy}
+            elif self.path == "/status":
+                code, body = 200, watcher.snapshot()
+            else:
+                code, body = 404, {"error": "Not Found"}
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logging.debug("Health endpoint: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep DNS in line with the course roster.")
+    parser.add_argument("--course", default=COURSE_ID, help="Blackboard course id")
+    parser.add_argument("--interval", type=int, default=WATCH_INTERVAL, help="seconds between roster polls")
+    parser.add_argument("--debounce", type=int, default=WATCH_DEBOUNCE, help="seconds a change must be stable")
+    parser.add_argument("--port", type=int, default=WATCH_HEALTH_PORT, help="health endpoint port (0 = off)")
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    args = parser.parse_args()
+    setup_logging()
+
+    store = open_store(STUDENT_DB, STUDENTS_FILE) if STUDENT_DB else None
+    # A single poll cannot wait for the roster to settle, so --once applies right away
+    watcher = Watcher(blackboard_roster(args.course), interval=args.interval,
+                      debounce=0 if args.once else args.debounce, store=store)
+    if args.once:
+        watcher.poll_once()
+    else:
+        if args.port:
+            serve_health(watcher, args.port)
+        signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            watcher.stop()
+    print(json.dumps(watcher.snapshot(), indent=2))
@@ -0,0 +1,94 @@
+import json
+import os
+from api_helper import api_get, on_zone_write
+from atomic_file import write_json_atomic
+from config import ZONE_CACHE_DIR
+
+def zone_serial(zone):
+    """(serial, edited_serial) of a zone body or /zones listing entry; changes whenever the zone does."""
+    return (zone.get("serial"), zone.get("edited_serial"))
+
+def _key(zone_name):
+    return zone_name.rstrip('.')
+
+class ZoneBodyCache:
+    """Full zone bodies on disk, one <dir>/<zone>.json per zone, valid for one serial.
+
+    get() only returns a body whose serial matches the one the caller got from
+    PowerDNS. Changes by other tools are noticed through that serial, which
+    PowerDNS bumps on API edits when the zone has SOA-EDIT-API; writes from this
+    process drop the entry right away (see forget_zone).
+    """
+
+    def __init__(self, directory=ZONE_CACHE_DIR):
+        self.directory = directory
+
+    def path(self, zone_name):
+        return os.path.join(self.directory, f"{_key(zone_name)}.json")
+
+    def get(self, zone_name, serial):
+        path = self.path(zone_name)
+        if serial is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                zone = json.load(f)
+        except ValueError:
+            return None
+        return zone if zone_serial(zone) == tuple(serial) else None
+
+    def put(self, zone):
+        write_json_atomic(self.path(zone["name"]), zone)
+
+    def forget(self, zone_name):
+        try:
+            os.remove(self.path(zone_name))
+        except FileNotFoundError:
+            pass
+
+_cache = ZoneBodyCache() if ZONE_CACHE_DIR else None
+
+def get_zone_cache():
+    """The shared cache, or None when ZONE_CACHE_DIR is empty."""
+    return _cache
+
+def set_zone_cache(cache):
+    """Replace the shared cache (None disables it), e.g. when switching to another server whose serials mean something else."""
+    global _cache
+    _cache = cache
+
+def forget_zone(zone_name):
+    """Drop the cached body of a zone this process just wrote to.
+
+    PowerDNS only changes the serial on API edits when the zone has SOA-EDIT-API,
+    so a serial match alone cannot be trusted after our own writes.
+    """
+    if _cache is not None:
+        _cache.forget(zone_name)
+
+on_zone_write(forget_zone)
+
+def listed_serial(zone_name):
+    """Current serial of one zone from the /zones listing (filtered to it), or None if it is not listed."""
+    fqdn = _key(zone_name) + "."
+    for zone in api_get("/zones", params={"zone": fqdn}) or []:
+        if zone["name"] == fqdn:
+            return zone_serial(zone)
+    return None
+
+def fetch_zone(zone_name, serial=None, cache=None):
+    """Full zone body, read from the cache when its serial still matches.
+
+    serial defaults to a lookup in the /zones listing, which is much smaller than
+    the zone. Raises requests.HTTPError like api_get when the zone is missing.
+    """
+    cache = cache or _cache
+    if cache is None:
+        return api_get(f"/zones/{_key(zone_name)}")
+    if serial is None:
+        serial = listed_serial(zone_name)
+    zone = cache.get(zone_name, serial)
+    if zone is None:
+        zone = api_get(f"/zones/{_key(zone_name)}")
+        cache.put(zone)
+    return zone
@@ -0,0 +1,161 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from api_helper import api_get
+from atomic_file import write_json_atomic
+from config import ZONE_MIRROR_DIR, DNS_PLAN_FILE
+from metrics import export_metrics
+from zone_cache import fetch_zone, zone_serial
+from log_setup import setup_logging
+from create_dns import PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE, get_zone, load_students
+from reconcile_dns import build_desired_state, build_current_state, compute_diff, apply_diff, diff_size
+
+RRSET_ZONES = (PARENT_ZONE, IPV4_PTR_ZONE, IPV6_PTR_ZONE)
+
+# On-disk layout: <mirror>/listing.json is the /zones listing,
+# <mirror>/zones/<zone>.json the full body of every zone whose rrsets we manage.
+
+def _write_json(path, data):
+    write_json_atomic(path, data, indent=1)
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _zone_path(mirror_dir, zone_name):
+    return os.path.join(mirror_dir, "zones", f"{zone_name.rstrip('.')}.json")
+
+def _listed_serials(listing):
+    return {z["name"].rstrip('.'): zone_serial(z) for z in listing}
+
+def pull(mirror_dir=ZONE_MIRROR_DIR, rrset_zones=RRSET_ZONES):
+    """Download the zone listing and every managed zone body into the mirror."""
+    _write_json(os.path.join(mirror_dir, "listing.json"), api_get("/zones"))
+    for zone_name in rrset_zones:
+        zone = get_zone(zone_name)
+        if zone:
+            _write_json(_zone_path(mirror_dir, zone_name), zone)
+    logging.info("Pulled %s zones into mirror %s", len(rrset_zones), mirror_dir)
+
+def refresh(mirror_dir=ZONE_MIRROR_DIR, rrset_zones=RRSET_ZONES, force_zones=()):
+    """Update the mirror with one listing call, re-downloading only zones whose serial changed.
+
+    Zones in force_zones are re-downloaded from the API even if their serial did not
+    change, since without SOA-EDIT-API a write leaves the serial as it was.
+    Returns the names of the zones that were re-downloaded.
+    """
+    forced = {zone.rstrip('.') for zone in force_zones}
+    listing = api_get("/zones")
+    _write_json(os.path.join(mirror_dir, "listing.json"), listing)
+    serials = _listed_serials(listing)
+
+    refreshed = []
+    for zone_name in rrset_zones:
+        path = _zone_path(mirror_dir, zone_name)
+        key = zone_name.rstrip('.')
+        if key not in serials:
+            continue
+        if key in forced:
+            zone = api_get(f"/zones/{zone_name}")
+        elif os.path.exists(path) and zone_serial(_read_json(path)) == serials[key]:
+            continue
+        else:
+            # The serial is already known from the listing, so only the body may need downloading
+            zone = fetch_zone(zone_name, serial=serials[key])
+        if zone:
+            _write_json(path, zone)
+            refreshed.append(zone_name)
+    logging.info("Refreshed mirror %s: %s of %s zones changed", mirror_dir, len(refreshed), len(rrset_zones))
+    return refreshed
+
+def load_current_state(mirror_dir=ZONE_MIRROR_DIR, rrset_zones=RRSET_ZONES):
+    """Current DNS state as reconcile_dns sees it, read from the mirror only."""
+    listing_path = os.path.join(mirror_dir, "listing.json")
+    if not os.path.exists(listing_path):
+        raise FileNotFoundError(f"No zone mirror in {mirror_dir}; run 'pull' first")
+    listing = _read_json(listing_path)
+    bodies = {}
+    for zone_name in rrset_zones:
+        path = _zone_path(mirror_dir, zone_name)
+        if os.path.exists(path):
+            bodies[zone_name] = _read_json(path)
+    return listing, build_current_state(listing, bodies)
+
+def plan(students, mirror_dir=ZONE_MIRROR_DIR, plan_path=DNS_PLAN_FILE, include_ipv4_ptr=False):
+    """Diff the desired state against the mirror without touching the API and save the plan."""
+    start = time.perf_counter()
+    listing, current = load_current_state(mirror_dir)
+    diff = compute_diff(build_desired_state(students, include_ipv4_ptr=include_ipv4_ptr), current)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    serials = _listed_serials(listing)
+    plan_data = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        # Serials the plan was computed against, so apply can detect drift
+        "serials": {zone.rstrip('.'): serials.get(zone.rstrip('.')) for zone in diff["rrsets"]},
+        "diff": diff
+    }
+    _write_json(plan_path, plan_data)
+    logging.info("Plan with %s zone-level writes computed in %.1f ms, saved to %s", diff_size(diff), elapsed_ms, plan_path)
+    return plan_data, elapsed_ms
+
+def print_plan(diff):
+    for zone in diff["delete_zones"]:
+        print(f"- zone {zone}")
+    for zone in diff["create_zones"]:
+        print(f"+ zone {zone['name']} ({zone['kind']}, masters {', '.join(zone['masters'])})")
+    for zone in diff["update_zones"]:
+        print(f"~ zone {zone['name']} masters → {', '.join(zone['masters'])}")
+    for zone, changes in diff["rrsets"].items():
+        for change in changes:
+            if change["changetype"] == "DELETE":
+                print(f"- {zone}: {change['name']} {change['type']}")
+            else:
+                contents = ", ".join(r["content"] for r in change["records"])
+                print(f"~ {zone}: {change['name']} {change['type']} → {contents}")
+    if diff_size(diff) == 0:
+        print("No changes.")
+
+def apply(plan_path=DNS_PLAN_FILE, mirror_dir=ZONE_MIRROR_DIR, force=False):
+    """Push a saved plan. Refuses when a planned zone changed since the plan, unless force is set."""
+    plan_data = _read_json(plan_path)
+    if not force:
+        current = _listed_serials(api_get("/zones"))
+        drifted = [
+            zone for zone, serial in plan_data["serials"].items()
+            if serial is not None and tuple(serial) != current.get(zone)
+        ]
+        if drifted:
+            raise RuntimeError(f"Zones changed since the plan was made: {', '.join(drifted)}; "
+                               f"refresh and plan again, or apply with force")
+
+    errors = apply_diff(plan_data["diff"])
+    # The written zones may keep their serial, so download them regardless
+    refresh(mirror_dir, force_zones=plan_data["diff"]["rrsets"])
+    return errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local PowerDNS zone mirror with plan/apply.")
+    parser.add_argument("command", choices=["pull", "refresh", "plan", "apply"])
+    parser.add_argument("--mirror", default=ZONE_MIRROR_DIR, help="mirror directory")
+    parser.add_argument("--plan", default=DNS_PLAN_FILE, help="plan file")
+    parser.add_argument("--force", action="store_true", help="apply even if zones changed since the plan")
+    args = parser.parse_args()
+    setup_logging()
+
+    if args.command == "pull":
+        pull(args.mirror)
+    elif args.command == "refresh":
+        refresh(args.mirror)
+    elif args.command == "plan":
+        plan_data, elapsed_ms = plan(load_students() or [], args.mirror, args.plan)
+        print_plan(plan_data["diff"])
+        print(f"Plan computed in {elapsed_ms:.1f} ms, saved to {args.plan}")
+    else:
+        errors = apply(args.plan, args.mirror, args.force)
+        export_metrics()
+        sys.exit(1 if errors else 0)